@@ -0,0 +1,298 @@
+"""
+Headless benchmarks for the store, search and paste paths, plus an opt-in
+clipboard backend comparison.
+
+    python benchmark.py --sizes 1000,10000,100000 --output bench.json
+    python benchmark.py --sizes 1000 --compare bench.json
+    python benchmark.py --sizes 0 --suites clipboard
+
+Results are written as JSON so runs from different commits can be compared.
+No display is needed except for the clipboard suite: the GUI is not
+imported and the paste suite stubs pyperclip/keyboard.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+from data_handler import DataHandler
+from search import TemplateSearch
+
+# Same as ui.MAX_RESULTS (importing ui would need a display)
+SEARCH_LIMIT = 500
+
+EN_WORDS = (
+    "meeting notes report invoice contract schedule thanks regards please confirm "
+    "attached review project update deadline client proposal summary weekly status "
+    "request approval budget estimate delivery follow up question answer"
+).split()
+JA_WORDS = (
+    "会議 議事録 報告 請求書 契約 確認 依頼 お疲れ様です よろしくお願いします 資料 送付 "
+    "日程 調整 見積 納品 承認 予算 進捗 週次 ご連絡 お問い合わせ 回答 添付"
+).split()
+CATEGORIES = ["General", "仕事", "Email", "社内", "Support", "営業", "Personal", "テンプレ"]
+
+def make_text(rng, words):
+    return " ".join(rng.choice(JA_WORDS if rng.random() < 0.5 else EN_WORDS) for _ in range(words))
+
+def make_corpus(size, seed=0):
+    """
+    Mixed Japanese/English templates. Body sizes are skewed: most are a few
+    lines, a few are tens of KB.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now().isoformat()
+    corpus = []
+    for i in range(size):
+        body_words = min(int(rng.lognormvariate(3.5, 1.0)), 8000)
+        corpus.append({
+            "id": f"bench-{i}",
+            "title": f"{make_text(rng, rng.randint(1, 4))} {i}",
+            "content": make_text(rng, max(body_words, 1)),
+            "category": rng.choice(CATEGORIES),
+            "timestamp": now
+        })
+    return corpus
+
+def summarize(suite, operation, size, samples, **extra):
+    samples_ms = sorted(s * 1000 for s in samples)
+    result = {
+        "suite": suite,
+        "operation": operation,
+        "size": size,
+        "n": len(samples_ms),
+        "mean_ms": statistics.fmean(samples_ms),
+        "p50_ms": samples_ms[len(samples_ms) // 2],
+        "p95_ms": samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))],
+        "min_ms": samples_ms[0],
+        "max_ms": samples_ms[-1],
+    }
+    result.update(extra)
+    return result
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return time.perf_counter() - start, value
+
+def bench_store(corpus, storage, ops, workdir):
+    size = len(corpus)
+    data_file = os.path.join(workdir, f"{storage}-{size}.json")
+    results = []
+
+    seed_handler = DataHandler(data_file=data_file, storage=storage, write_delay=0)
+    seed_handler.save_data([dict(item) for item in corpus])
+
+    # Cold load: new handler, first read parses the file
+    samples = []
+    for _ in range(3):
+        handler = DataHandler(data_file=data_file, storage=storage, write_delay=0)
+        elapsed, _ = timed(handler.load_data)
+        samples.append(elapsed)
+    results.append(summarize("store", "load", size, samples, storage=storage))
+
+    handler = DataHandler(data_file=data_file, storage=storage, write_delay=0)
+    handler.load_data()
+    rng = random.Random(1)
+
+    samples = []
+    added = []
+    for i in range(ops):
+        elapsed, item = timed(handler.add_template, f"bench add {i}", make_text(rng, 50), "General")
+        samples.append(elapsed)
+        added.append(item['id'])
+    results.append(summarize("store", "add", size, samples, storage=storage))
+
+    samples = []
+    for i in range(ops):
+        item_id = corpus[rng.randrange(size)]['id']
+        elapsed, _ = timed(handler.update_template, item_id, f"bench update {i}", make_text(rng, 50), "仕事")
+        samples.append(elapsed)
+    results.append(summarize("store", "update", size, samples, storage=storage))
+
+    samples = [timed(handler.delete_template, item_id)[0] for item_id in added]
+    results.append(summarize("store", "delete", size, samples, storage=storage))
+
+    samples = [timed(handler.get_categories)[0] for _ in range(ops)]
+    results.append(summarize("store", "get_categories", size, samples, storage=storage))
+    handler.flush()
+    return results
+
+def bench_search(corpus):
+    """
+    Mirrors MainWindow.refresh_list/find_matches without the GUI.
+    """
+    size = len(corpus)
+    results = []
+    items = sorted(corpus, key=lambda x: (x.get('category', 'ZZZ'), x.get('title', '')))
+
+    index = TemplateSearch()
+    elapsed, _ = timed(index.sync, items)
+    results.append(summarize("search", "index_build", size, [elapsed]))
+
+    queries = {
+        "1char": ["m", "会", "r", "請"],
+        "2char": ["me", "議事", "re", "確認"],
+        "word": ["meeting", "請求書", "invoice", "お疲れ様です"],
+        "fuzzy": ["mtng", "invce", "wkly sts"],
+        "miss": ["zzzz", "存在しない"],
+    }
+    for kind, words in queries.items():
+        samples = []
+        for q in words:
+            index.cache.clear()
+            samples.append(timed(index.search, q, limit=SEARCH_LIMIT)[0])
+        results.append(summarize("search", f"query_{kind}", size, samples))
+
+    # Typing a word one keystroke at a time, then backspacing (cache path)
+    samples = []
+    for word in ["meeting", "請求書の送付", "weekly status"]:
+        index.cache.clear()
+        prefixes = [word[:i] for i in range(1, len(word) + 1)]
+        for q in prefixes + prefixes[-2::-1]:
+            samples.append(timed(index.search, q, limit=SEARCH_LIMIT)[0])
+    results.append(summarize("search", "typing", size, samples))
+    return results
+
+def install_clipboard_stubs():
+    """
+    Replaces pyperclip/keyboard with in-process fakes so paste_text runs headless.
+    """
+    clipboard = {"text": ""}
+    pyperclip = types.ModuleType("pyperclip")
+    pyperclip.copy = lambda text: clipboard.__setitem__("text", text)
+    pyperclip.paste = lambda: clipboard["text"]
+    keyboard = types.ModuleType("keyboard")
+    keyboard.send = lambda hotkey: None
+    keyboard.add_hotkey = lambda *args, **kwargs: None
+    sys.modules["pyperclip"] = pyperclip
+    sys.modules["keyboard"] = keyboard
+
+def bench_paste(corpus, ops):
+    install_clipboard_stubs()
+    from clipboard_manager import ClipboardManager
+    manager = ClipboardManager()
+    rng = random.Random(2)
+    samples = [timed(manager.paste_text, corpus[rng.randrange(len(corpus))]['content'])[0] for _ in range(ops)]
+    return [summarize("paste", "paste_text", len(corpus), samples)]
+
+def bench_clipboard(ops, backends):
+    """
+    Compares the real clipboard backends (needs a display; run before the
+    paste suite, which replaces pyperclip with a stub).
+    """
+    from clipboard_backends import CLIPBOARD_BACKENDS
+    import tkinter as tk
+    results = []
+    rng = random.Random(3)
+    texts = {"small": make_text(rng, 20), "large": make_text(rng, 20000)}
+    for name in backends:
+        root = None
+        try:
+            root = tk.Tk()
+            root.withdraw()
+            backend = CLIPBOARD_BACKENDS[name](root)
+            for label, text in texts.items():
+                set_samples, get_samples, confirm_samples = [], [], []
+                for i in range(ops):
+                    value = f"{text} {i}"
+                    set_samples.append(timed(backend.set_text, value)[0])
+                    start = time.perf_counter()
+                    while backend.get_text() != value:
+                        root.update()
+                    confirm_samples.append(time.perf_counter() - start)
+                    get_samples.append(timed(backend.get_text)[0])
+                extra = {"backend": name, "text": label}
+                results.append(summarize("clipboard", "set", 0, set_samples, **extra))
+                results.append(summarize("clipboard", "get", 0, get_samples, **extra))
+                results.append(summarize("clipboard", "set_until_visible", 0, confirm_samples, **extra))
+            backend.close()
+        except Exception as e:
+            print(f"clipboard/{name} skipped: {e}", file=sys.stderr)
+        finally:
+            if root is not None:
+                root.destroy()
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(baseline_path, results):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    key = lambda r: (r["suite"], r["operation"], r["size"], r.get("storage") or r.get("backend"), r.get("text"))
+    old = {key(r): r for r in baseline.get("results", [])}
+    print(f"{'benchmark':<48} {'old p50':>10} {'new p50':>10} {'ratio':>7}")
+    for r in results:
+        prev = old.get(key(r))
+        if prev is None:
+            continue
+        name = "/".join(str(part) for part in key(r) if part is not None)
+        ratio = r["p50_ms"] / prev["p50_ms"] if prev["p50_ms"] else float("inf")
+        print(f"{name:<48} {prev['p50_ms']:>10.3f} {r['p50_ms']:>10.3f} {ratio:>6.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for store, search and paste.")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated corpus sizes (up to 1000000)")
+    parser.add_argument("--storage", default="json,journal,sqlite,split", help="storage backends to time")
+    parser.add_argument("--suites", default="store,search,paste",
+                        help="store, search, paste and/or clipboard (needs a display)")
+    parser.add_argument("--clipboard-backends", default="tk,helper,pyperclip")
+    parser.add_argument("--ops", type=int, default=20, help="operations per store/paste benchmark")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    suites = set(args.suites.split(","))
+    results = []
+    if "clipboard" in suites:
+        results += bench_clipboard(args.ops, args.clipboard_backends.split(","))
+    with tempfile.TemporaryDirectory(prefix="clipboard-bench-") as workdir:
+        for size in sizes:
+            corpus = make_corpus(size)
+            print(f"[{size}] corpus ready", file=sys.stderr)
+            if "store" in suites:
+                for storage in args.storage.split(","):
+                    results += bench_store(corpus, storage, args.ops, workdir)
+                    print(f"[{size}] store/{storage} done", file=sys.stderr)
+            if "search" in suites:
+                results += bench_search(corpus)
+                print(f"[{size}] search done", file=sys.stderr)
+            if "paste" in suites:
+                results += bench_paste(corpus, args.ops)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,139 @@
-import PyInstaller.__main__
-import customtkinter
+import argparse
+import json
 import os
+import shutil
+import statistics
+import subprocess
 import sys
+import tempfile
+import time
+from single_instance import INSTANCE_ENV
 
-# Get customtkinter path for data inclusion
-ctk_path = os.path.dirname(customtkinter.__file__)
-
-print(f"CustomTkinter path found: {ctk_path}")
-
-# Build command arguments
-args = [
-    'main.py',                        # Main script
-    '--name=ClipboardManager',        # Executable name
-    '--onefile',                      # Single file
-    '--noconsole',                    # No terminal window
-    '--clean',                        # Clean cache
-    f'--add-data={ctk_path}{os.pathsep}customtkinter', # Include CTk assets
-    # Add other hidden imports if needed
-    '--hidden-import=keyboard',
-    '--hidden-import=pyperclip',
-    '--hidden-import=PIL',            # CTk often needs PIL
-    '--hidden-import=PIL._tkinter_finder',
+APP_NAME = "ClipboardManager"
+BUILD_MODES = ["onefile", "onedir"]
+
+# Modules the app never uses but PyInstaller may pull in through other packages
+DEFAULT_EXCLUDES = [
+    "numpy", "pandas", "matplotlib", "scipy", "IPython", "pytest",
+    "setuptools", "pkg_resources", "lib2to3", "pydoc_data", "idlelib",
+    "test", "tkinter.test",
 ]
 
-print("Starting build process...")
-PyInstaller.__main__.run(args)
-print("Build complete! Check 'dist' folder.")
+def artifact_path(mode):
+    exe = APP_NAME + (".exe" if sys.platform == "win32" else "")
+    if mode == "onedir":
+        # Folder with the exe next to its libraries: nothing is unpacked per launch
+        return os.path.join("dist", "onedir", APP_NAME, exe)
+    return os.path.join("dist", exe)
+
+def build(mode, excludes, optimize=0):
+    import PyInstaller.__main__
+    import customtkinter
+
+    # Get customtkinter path for data inclusion
+    ctk_path = os.path.dirname(customtkinter.__file__)
+
+    print(f"CustomTkinter path found: {ctk_path}")
+
+    # Build command arguments
+    args = [
+        'main.py',                        # Main script
+        f'--name={APP_NAME}',             # Executable name
+        f'--{mode}',                      # Single file, or a folder (faster start)
+        '--noconsole',                    # No terminal window
+        '--clean',                        # Clean cache
+        '--noconfirm',                    # Replace a previous onedir output
+        f'--add-data={ctk_path}{os.pathsep}customtkinter', # Include CTk assets
+        # Add other hidden imports if needed
+        '--hidden-import=keyboard',
+        '--hidden-import=pyperclip',
+        '--hidden-import=PIL',            # CTk often needs PIL
+        '--hidden-import=PIL._tkinter_finder',
+    ]
+    if mode == "onedir":
+        args.append(f'--distpath={os.path.join("dist", "onedir")}')
+    for module in excludes:
+        args.append(f'--exclude-module={module}')
+    if optimize:
+        # Bytecode is compiled at this level at build time (2 also drops docstrings)
+        args.append(f'--optimize={optimize}')
+
+    print(f"Starting build process ({mode})...")
+    PyInstaller.__main__.run(args)
+    print(f"Build complete! Check '{os.path.dirname(artifact_path(mode))}' folder.")
+
+def launch_once(exe, timeout=60):
+    """
+    Starts the built app with --profile-startup --exit-after-startup in a
+    scratch folder and returns (hotkeys ready, list shown) in ms since launch.
+    """
+    exe = os.path.abspath(exe)
+    with tempfile.TemporaryDirectory(prefix="clipboard-startup-") as workdir:
+        # Skip the first-run dialog
+        with open(os.path.join(workdir, "config.json"), 'w') as f:
+            json.dump({"setup_completed": True}, f)
+        if os.path.exists("templates.json"):
+            shutil.copy("templates.json", workdir)
+
+        # Own single-instance endpoint: otherwise a running copy of the app
+        # would receive the launch as a forwarded command and nothing starts
+        env = dict(os.environ, **{INSTANCE_ENV: "startup-benchmark"})
+        started = time.time()
+        proc = subprocess.Popen([exe, "--profile-startup", "--exit-after-startup"], cwd=workdir, env=env)
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise RuntimeError(f"{exe} did not finish starting within {timeout}s")
+
+        profile = os.path.join(workdir, "startup_profile.json")
+        if not os.path.exists(profile):
+            raise RuntimeError(f"{exe} exited with code {proc.returncode} without writing startup_profile.json")
+        with open(profile, 'r', encoding='utf-8') as f:
+            wall_clock = json.load(f)["wall_clock"]
+        return ((wall_clock["hotkeys"] - started) * 1000,
+                (wall_clock["list_populated"] - started) * 1000)
+
+def benchmark(modes, runs):
+    print(f"\n{'mode':<10} {'runs':>4} {'hotkeys p50':>12} {'min':>8} {'max':>8} {'list p50':>10}")
+    for mode in modes:
+        exe = artifact_path(mode)
+        if not os.path.exists(exe):
+            print(f"{mode:<10} not built ({exe} missing)")
+            continue
+        hotkeys, listed = [], []
+        for _ in range(runs):
+            hotkey_ms, list_ms = launch_once(exe)
+            hotkeys.append(hotkey_ms)
+            listed.append(list_ms)
+        print(f"{mode:<10} {runs:>4} {statistics.median(hotkeys):>9.0f} ms {min(hotkeys):>5.0f} ms "
+              f"{max(hotkeys):>5.0f} ms {statistics.median(listed):>7.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Builds {APP_NAME} with PyInstaller.")
+    parser.add_argument("--mode", default="onefile",
+                        help="onefile (default), onedir, or both separated by a comma")
+    parser.add_argument("--exclude", action="append", default=[], help="extra module to leave out")
+    parser.add_argument("--no-default-excludes", action="store_true")
+    parser.add_argument("--optimize", type=int, choices=[0, 1, 2], default=0,
+                        help="compile bytecode at this optimization level")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="after building, launch each build repeatedly and report time until hotkeys are live")
+    parser.add_argument("--no-build", action="store_true", help="only benchmark existing builds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    modes = [m for m in args.mode.split(",") if m]
+    for mode in modes:
+        if mode not in BUILD_MODES:
+            parser.error(f"unknown mode '{mode}'")
+    excludes = ([] if args.no_default_excludes else DEFAULT_EXCLUDES) + args.exclude
+
+    if not args.no_build:
+        for mode in modes:
+            build(mode, excludes, args.optimize)
+    if args.benchmark:
+        benchmark(modes, args.runs)
+
+if __name__ == "__main__":
+    main()
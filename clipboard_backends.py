@@ -0,0 +1,229 @@
+"""
+Clipboard backends used by ClipboardManager. Each backend has
+get_text() -> str, set_text(text) and close().
+
+- "tk":        the running Tk root's clipboard, in-process (no subprocess per call)
+- "helper":    a long-lived helper process that owns a hidden Tk clipboard
+- "pyperclip": pyperclip (spawns xclip/xsel per call on Linux)
+"""
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+
+# argv flag that starts the helper loop (main.py forwards it when frozen)
+HELPER_ARG = "--clipboard-helper"
+
+
+class PyperclipClipboard:
+    name = "pyperclip"
+
+    def __init__(self, root=None):
+        import pyperclip
+        self._pyperclip = pyperclip
+
+    def get_text(self):
+        return self._pyperclip.paste()
+
+    def set_text(self, text):
+        self._pyperclip.copy(text)
+
+    def close(self):
+        pass
+
+
+class TkClipboard:
+    """
+    Uses the clipboard of an existing Tk root. Tk may only be called from
+    the thread that owns it, so calls from other threads (restore timer) go
+    to a pyperclip fallback. The clipboard monitor reads on the Tk thread.
+    """
+    name = "tk"
+
+    def __init__(self, root):
+        if root is None:
+            raise ValueError("tk clipboard backend needs a Tk root")
+        self.root = root
+        self._owner = threading.get_ident()
+        self._fallback = None
+
+    def _other_thread(self):
+        if threading.get_ident() == self._owner:
+            return None
+        if self._fallback is None:
+            self._fallback = PyperclipClipboard()
+        return self._fallback
+
+    def get_text(self):
+        fallback = self._other_thread()
+        if fallback:
+            return fallback.get_text()
+        import tkinter as tk
+        try:
+            return self.root.clipboard_get()
+        except tk.TclError:
+            # Empty clipboard or no text format
+            return ""
+
+    def set_text(self, text):
+        fallback = self._other_thread()
+        if fallback:
+            fallback.set_text(text)
+            return
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+
+    def close(self):
+        pass
+
+
+class HelperProcessClipboard:
+    """
+    Talks to one long-lived helper process over its stdin/stdout with
+    line-delimited JSON, so no process is started per clipboard call.
+    The helper is restarted once if it died.
+    """
+    name = "helper"
+
+    def __init__(self, root=None):
+        self._proc = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _command(self):
+        if getattr(sys, 'frozen', False):
+            return [sys.executable, HELPER_ARG]
+        return [sys.executable, os.path.abspath(__file__), HELPER_ARG]
+
+    def _start(self):
+        flags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+        self._proc = subprocess.Popen(
+            self._command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding='ascii', bufsize=1, creationflags=flags
+        )
+
+    def _request(self, message):
+        with self._lock:
+            for attempt in range(2):
+                if self._proc is None or self._proc.poll() is not None:
+                    self._start()
+                try:
+                    # ensure_ascii keeps every message on one ASCII line
+                    self._proc.stdin.write(json.dumps(message) + "\n")
+                    self._proc.stdin.flush()
+                    line = self._proc.stdout.readline()
+                except (BrokenPipeError, OSError):
+                    line = ""
+                if line:
+                    reply = json.loads(line)
+                    if "error" in reply:
+                        raise RuntimeError(reply["error"])
+                    return reply
+                self._proc = None
+            raise RuntimeError("clipboard helper process is not responding")
+
+    def get_text(self):
+        return self._request({"op": "get"}).get("text", "")
+
+    def set_text(self, text):
+        self._request({"op": "set", "text": text})
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=1)
+            except Exception:
+                proc.kill()
+
+
+def serve_helper():
+    """
+    Helper process main loop: a hidden Tk root answering get/set requests
+    from stdin. It has to keep running the Tk event loop, because on X11
+    other applications read the clipboard from its owner.
+    """
+    import tkinter as tk
+    root = tk.Tk()
+    root.withdraw()
+    backend = TkClipboard(root)
+
+    def handle(line):
+        try:
+            message = json.loads(line)
+            if message.get("op") == "set":
+                backend.set_text(message.get("text", ""))
+                reply = {"ok": True}
+            else:
+                reply = {"text": backend.get_text()}
+        except Exception as e:
+            reply = {"error": str(e)}
+        sys.stdout.write(json.dumps(reply) + "\n")
+        sys.stdout.flush()
+
+    if hasattr(root, 'createfilehandler'):
+        # Unix: Tk wakes us when stdin is readable
+        buffered = [b""]
+        fd = sys.stdin.fileno()
+
+        def on_readable(*args):
+            data = os.read(fd, 65536)
+            if not data:
+                root.destroy()
+                return
+            *lines, buffered[0] = (buffered[0] + data).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    handle(line.decode('ascii'))
+
+        root.createfilehandler(fd, tk.READABLE, on_readable)
+    else:
+        # Windows: read on a thread, hand lines to the Tk thread
+        import queue
+        lines = queue.Queue()
+
+        def reader():
+            for line in sys.stdin:
+                lines.put(line)
+            lines.put(None)
+
+        def poll():
+            try:
+                while True:
+                    line = lines.get_nowait()
+                    if line is None:
+                        root.destroy()
+                        return
+                    handle(line)
+            except queue.Empty:
+                pass
+            root.after(10, poll)
+
+        threading.Thread(target=reader, daemon=True).start()
+        poll()
+    root.mainloop()
+
+
+CLIPBOARD_BACKENDS = {
+    TkClipboard.name: TkClipboard,
+    HelperProcessClipboard.name: HelperProcessClipboard,
+    PyperclipClipboard.name: PyperclipClipboard,
+}
+
+def create_clipboard_backend(name, root=None):
+    backend = CLIPBOARD_BACKENDS.get(name or PyperclipClipboard.name)
+    if backend is None:
+        print(f"Unknown clipboard backend '{name}', falling back to pyperclip")
+        backend = PyperclipClipboard
+    try:
+        return backend(root)
+    except Exception as e:
+        print(f"Error creating clipboard backend '{name}': {e}")
+        return PyperclipClipboard(root)
+
+
+if __name__ == "__main__" and HELPER_ARG in sys.argv:
+    serve_helper()
@@ -1,31 +1,418 @@
-import pyperclip
-import keyboard
 import time
+import os
+import sys
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+import metrics
+from clipboard_backends import PyperclipClipboard
+
+# History entries look like templates; their ids carry this prefix
+HISTORY_ID_PREFIX = "history:"
+HISTORY_CATEGORY = "📋 History"
+HISTORY_TITLE_LENGTH = 40
+
+def is_history_item(item):
+    return str(item.get('id', '')).startswith(HISTORY_ID_PREFIX)
+
+# Paste: wait until the clipboard really holds the new text before Ctrl+V
+PASTE_CONFIRM_TIMEOUT = 0.5
+PASTE_POLL_INTERVAL = 0.002
+PASTE_POLL_MAX_INTERVAL = 0.025
+# Restore: give the target application time to read the clipboard first
+RESTORE_DELAY = 0.3
+
+# Clipboard change notifications (ClipboardMonitor)
+WM_QUIT = 0x0012
+WM_CLIPBOARDUPDATE = 0x031D
+HWND_MESSAGE = -3
+PM_NOREMOVE = 0x0000
+XFIXES_SELECTION_NOTIFY = 0 # XFixesSelectionNotify, relative to the extension's event base
+XFIXES_SET_SELECTION_OWNER_NOTIFY_MASK = 1
+
+def _same_text(a, b):
+    # Windows may hand back CRLF line endings for text set with LF
+    return a is not None and a.replace("\r\n", "\n") == b.replace("\r\n", "\n")
 
 class ClipboardManager:
-    def __init__(self):
-        pass
+    def __init__(self, backend=None, restore_clipboard=False):
+        # See clipboard_backends; pyperclip unless a faster one is set
+        self.backend = backend or PyperclipClipboard()
+        # Last text we put on the clipboard ourselves (not user history)
+        self.last_set_text = None
+        # Put the user's previous clipboard back after pasting a template
+        self.restore_clipboard = restore_clipboard
 
     def get_clipboard_text(self):
-        return pyperclip.paste()
+        return self.backend.get_text()
 
     def set_clipboard_text(self, text):
-        pyperclip.copy(text)
+        self.last_set_text = text
+        self.backend.set_text(text)
 
+    def wait_for_clipboard(self, text, timeout=PASTE_CONFIRM_TIMEOUT):
+        """
+        Polls with a short backoff until the clipboard contains text.
+        Returns False if it still doesn't after `timeout` seconds.
+        """
+        deadline = time.perf_counter() + timeout
+        delay = PASTE_POLL_INTERVAL
+        while True:
+            try:
+                if _same_text(self.get_clipboard_text(), text):
+                    return True
+            except Exception:
+                # Another process may hold the clipboard open; retry
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, PASTE_POLL_MAX_INTERVAL)
+
+    @metrics.traced("clipboard.paste_text")
     def paste_text(self, text):
         """
-        Sets the text to clipboard and simulates Ctrl+V.
+        Sets the text to clipboard and simulates Ctrl+V once the clipboard
+        is confirmed to hold it. Returns True if Ctrl+V was sent.
         """
-        original = self.get_clipboard_text()
         try:
+            original = self.get_clipboard_text() if self.restore_clipboard else None
             self.set_clipboard_text(text)
-            # Short delay to ensure clipboard is updated
-            time.sleep(0.1)
+            if not self.wait_for_clipboard(text):
+                # Pasting now could insert the old clipboard contents
+                print("Error pasting text: clipboard was not updated in time")
+                return False
+            # Only pasting needs it; the history classes work without it
+            import keyboard
             keyboard.send('ctrl+v')
-            # Restore original clipboard? Maybe optional, but user might want to keep the pasted item.
-            # For this utility, usually we want the pasted item to remain or maybe not.
-            # Let's keep it simple: just paste.
+            if original is not None and not _same_text(original, text):
+                self.restore_later(original, text)
+            return True
         except Exception as e:
             print(f"Error pasting text: {e}")
+            return False
+
+    def restore_later(self, original, pasted, delay=RESTORE_DELAY):
+        """
+        Puts `original` back on the clipboard after `delay` seconds on a
+        timer thread, unless something else was copied in the meantime.
+        """
+        def restore():
+            try:
+                if _same_text(self.get_clipboard_text(), pasted):
+                    self.set_clipboard_text(original)
+            except Exception as e:
+                print(f"Error restoring clipboard: {e}")
+        timer = threading.Timer(delay, restore)
+        timer.daemon = True
+        timer.start()
+
+
+class ClipboardHistory:
+    """
+    Bounded clipboard history. Holds at most `max_items` entries and
+    `max_bytes` of UTF-8 text; the oldest entries are evicted first.
+    Entries are keyed by content hash, so copying the same text again only
+    moves it to the front.
+    """
+    def __init__(self, max_items=200, max_bytes=2 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # hash -> entry, oldest first
+        self._sizes = {}
+        self.total_bytes = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, text):
+        """
+        Records text. Returns True if the history changed.
+        """
+        if not text or not text.strip():
+            return False
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return False
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        now = datetime.datetime.now().isoformat()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                entry['timestamp'] = now
+                self._entries.move_to_end(digest)
+            else:
+                first_line = text.strip().splitlines()[0]
+                if len(first_line) > HISTORY_TITLE_LENGTH:
+                    first_line = first_line[:HISTORY_TITLE_LENGTH] + "..."
+                self._entries[digest] = {
+                    "id": HISTORY_ID_PREFIX + digest,
+                    "title": first_line,
+                    "content": text,
+                    "category": HISTORY_CATEGORY,
+                    "timestamp": now
+                }
+                self._sizes[digest] = size
+                self.total_bytes += size
+                while len(self._entries) > self.max_items or self.total_bytes > self.max_bytes:
+                    old_digest, _ = self._entries.popitem(last=False)
+                    self.total_bytes -= self._sizes.pop(old_digest)
+            self.version += 1
+        return True
+
+    def remove(self, item_id):
+        digest = str(item_id)[len(HISTORY_ID_PREFIX):]
+        with self._lock:
+            if self._entries.pop(digest, None) is None:
+                return False
+            self.total_bytes -= self._sizes.pop(digest)
+            self.version += 1
+        return True
+
+    def entries(self, limit=None):
+        """
+        Returns entries newest first.
+        """
+        with self._lock:
+            items = list(reversed(self._entries.values()))
+        return items if limit is None else items[:limit]
+
+    def search(self, query, limit=None):
+        """
+        Newest-first entries whose content contains query (already lowercased).
+        """
+        result = []
+        for item in self.entries():
+            if query in item['content'].lower():
+                result.append(item)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+class ClipboardMonitor:
+    """
+    Records clipboard changes into a ClipboardHistory. A background thread
+    waits for change notifications: AddClipboardFormatListener on Windows,
+    XFixes selection-owner events on X11. Where neither is available it
+    polls with an interval that backs off while nothing changes.
+
+    The thread never reads the clipboard itself. It calls schedule_check(),
+    which should run check() on the Tk thread, where the "tk" backend reads
+    in-process instead of starting xclip/xsel. Without schedule_check,
+    check() runs on the monitor thread.
+    """
+    def __init__(self, clipboard_manager, history, on_change=None, schedule_check=None,
+                 interval=0.5, max_interval=3.0):
+        self.clipboard_manager = clipboard_manager
+        self.history = history
+        self.on_change = on_change
+        self.schedule_check = schedule_check
+        self.interval = interval
+        self.max_interval = max_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_text = None
+        self._delay = interval
+        self._thread_id = None # Windows: native id of the thread owning the listener window
+        self._wake = None # X11: pipe written by stop()
+        # "AddClipboardFormatListener", "XFixes" or "polling" once running
+        self.method = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ClipboardMonitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread_id is not None:
+            import ctypes
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+        if self._wake is not None:
+            try:
+                os.write(self._wake[1], b"x")
+            except OSError:
+                pass
+
+    def _changed(self):
+        if self.schedule_check is not None:
+            self.schedule_check()
+        else:
+            self.check()
+
+    def check(self):
+        """
+        Reads the clipboard and records it if it changed.
+        """
+        try:
+            text = self.clipboard_manager.get_clipboard_text()
+        except Exception as e:
+            print(f"Clipboard monitor error: {e}")
+            self._delay = self.max_interval
+            return
+        # With notifications the same text means it was copied again
+        if text == self._last_text and self.method == "polling":
+            self._delay = min(self._delay * 1.5, self.max_interval)
+            return
+        self._last_text = text
+        self._delay = self.interval
+        # Don't record what we put there ourselves when pasting a template
+        if text == self.clipboard_manager.last_set_text:
+            return
+        if self.history.add(text) and self.on_change:
+            self.on_change()
+
+    def _run(self):
+        # What is on the clipboard already goes first
+        self._changed()
+        try:
+            if sys.platform == "win32" and self._listen_windows():
+                return
+            if sys.platform.startswith("linux") and self._listen_xfixes():
+                return
+        except Exception as e:
+            print(f"Clipboard change notifications unavailable: {e}")
+        self.method = "polling"
+        while not self._stop.wait(self._delay):
+            self._changed()
+
+    def _listen_windows(self):
+        """
+        Waits for WM_CLIPBOARDUPDATE on a message-only window until stop().
+        Returns False if the listener can't be set up.
+        """
+        import ctypes
+        from ctypes import wintypes
+        user32 = ctypes.WinDLL("user32", use_last_error=True)
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        LRESULT = ctypes.c_ssize_t
+        WNDPROC = ctypes.WINFUNCTYPE(LRESULT, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+
+        class WNDCLASSW(ctypes.Structure):
+            _fields_ = [("style", wintypes.UINT), ("lpfnWndProc", WNDPROC),
+                        ("cbClsExtra", ctypes.c_int), ("cbWndExtra", ctypes.c_int),
+                        ("hInstance", wintypes.HINSTANCE), ("hIcon", wintypes.HICON),
+                        ("hCursor", wintypes.HANDLE), ("hbrBackground", wintypes.HBRUSH),
+                        ("lpszMenuName", wintypes.LPCWSTR), ("lpszClassName", wintypes.LPCWSTR)]
+
+        user32.DefWindowProcW.restype = LRESULT
+        user32.DefWindowProcW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+        user32.CreateWindowExW.restype = wintypes.HWND
+        user32.CreateWindowExW.argtypes = [wintypes.DWORD, wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.DWORD,
+                                           ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                           wintypes.HWND, wintypes.HMENU, wintypes.HINSTANCE, wintypes.LPVOID]
+        user32.AddClipboardFormatListener.argtypes = [wintypes.HWND]
+        user32.RemoveClipboardFormatListener.argtypes = [wintypes.HWND]
+        user32.DestroyWindow.argtypes = [wintypes.HWND]
+        user32.RegisterClassW.argtypes = [ctypes.POINTER(WNDCLASSW)]
+        user32.UnregisterClassW.argtypes = [wintypes.LPCWSTR, wintypes.HINSTANCE]
+        user32.GetMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT]
+        user32.DispatchMessageW.argtypes = [ctypes.POINTER(wintypes.MSG)]
+        user32.PeekMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND,
+                                        wintypes.UINT, wintypes.UINT, wintypes.UINT]
+        kernel32.GetModuleHandleW.restype = wintypes.HMODULE
+        kernel32.GetModuleHandleW.argtypes = [wintypes.LPCWSTR]
+
+        def window_proc(hwnd, message, wparam, lparam):
+            if message == WM_CLIPBOARDUPDATE:
+                self._changed()
+                return 0
+            return user32.DefWindowProcW(hwnd, message, wparam, lparam)
+
+        # Kept referenced until the window is gone
+        callback = WNDPROC(window_proc)
+        instance = kernel32.GetModuleHandleW(None)
+        class_name = f"ClipboardMonitor-{id(self)}"
+        window_class = WNDCLASSW(lpfnWndProc=callback, hInstance=instance, lpszClassName=class_name)
+        if not user32.RegisterClassW(ctypes.byref(window_class)):
+            return False
+        hwnd = user32.CreateWindowExW(0, class_name, class_name, 0, 0, 0, 0, 0,
+                                      HWND_MESSAGE, None, instance, None)
+        try:
+            if not hwnd or not user32.AddClipboardFormatListener(hwnd):
+                return False
+            self.method = "AddClipboardFormatListener"
+            msg = wintypes.MSG()
+            # Create the thread's message queue before stop() may post WM_QUIT to it
+            user32.PeekMessageW(ctypes.byref(msg), None, 0, 0, PM_NOREMOVE)
+            self._thread_id = kernel32.GetCurrentThreadId()
+            if self._stop.is_set():
+                return True
+            # Blocks until a message arrives; 0 means WM_QUIT from stop()
+            while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                user32.DispatchMessageW(ctypes.byref(msg))
+            return True
+        finally:
+            self._thread_id = None
+            if hwnd:
+                user32.RemoveClipboardFormatListener(hwnd)
+                user32.DestroyWindow(hwnd)
+            user32.UnregisterClassW(class_name, instance)
+
+    def _listen_xfixes(self):
+        """
+        Waits for CLIPBOARD owner changes on its own X connection until
+        stop(). Returns False without X11 or the XFixes extension.
+        """
+        import ctypes
+        import ctypes.util
+        import select
+        x11_name = ctypes.util.find_library("X11")
+        xfixes_name = ctypes.util.find_library("Xfixes")
+        if not (os.environ.get("DISPLAY") and x11_name and xfixes_name):
+            return False
+        x11 = ctypes.CDLL(x11_name)
+        xfixes = ctypes.CDLL(xfixes_name)
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XInternAtom.restype = ctypes.c_ulong
+        x11.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        for name in ("XConnectionNumber", "XPending", "XFlush", "XCloseDisplay"):
+            getattr(x11, name).argtypes = [ctypes.c_void_p]
+        x11.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        xfixes.XFixesQueryExtension.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_int),
+                                                ctypes.POINTER(ctypes.c_int)]
+        xfixes.XFixesSelectSelectionInput.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                                      ctypes.c_ulong, ctypes.c_ulong]
+
+        display = x11.XOpenDisplay(None)
+        if not display:
+            return False
+        try:
+            event_base, error_base = ctypes.c_int(), ctypes.c_int()
+            if not xfixes.XFixesQueryExtension(display, ctypes.byref(event_base), ctypes.byref(error_base)):
+                return False
+            clipboard = x11.XInternAtom(display, b"CLIPBOARD", False)
+            xfixes.XFixesSelectSelectionInput(display, x11.XDefaultRootWindow(display), clipboard,
+                                              XFIXES_SET_SELECTION_OWNER_NOTIFY_MASK)
+            x11.XFlush(display)
+            self.method = "XFixes"
+            self._wake = os.pipe()
+            fd = x11.XConnectionNumber(display)
+            # XEvent is a union padded to 24 longs
+            event = ctypes.create_string_buffer(24 * ctypes.sizeof(ctypes.c_long))
+            notify = event_base.value + XFIXES_SELECTION_NOTIFY
+            while not self._stop.is_set():
+                changed = False
+                while x11.XPending(display):
+                    x11.XNextEvent(display, event)
+                    if ctypes.c_int.from_buffer(event).value == notify:
+                        changed = True
+                if changed:
+                    self._changed()
+                # No timeout: stop() wakes us through the pipe
+                select.select([fd, self._wake[0]], [], [])
+            return True
         finally:
-            pass
+            x11.XCloseDisplay(display)
+            if self._wake is not None:
+                wake, self._wake = self._wake, None
+                os.close(wake[0])
+                os.close(wake[1])
@@ -1,73 +1,391 @@
+import atexit
+import csv
 import json
 import os
+import sys
+import time
 import uuid
 import datetime
+import threading
+from storage import create_storage, StorageReadError
 
 DATA_FILE = "templates.json"
 
+# Mutations within this window (seconds) are written together in the background
+WRITE_BEHIND_DELAY = 0.25
+
+# Bulk import/export
+EXPORT_FIELDS = ["id", "title", "content", "category", "timestamp"]
+IMPORT_BATCH_SIZE = 10000
+
+def detect_format(path):
+    return "csv" if os.path.splitext(path)[1].lower() == ".csv" else "jsonl"
+
+def iter_records(path, fmt=None):
+    """
+    Streams template records from a JSON Lines or CSV file one at a time.
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == "csv":
+            # Bodies can be far larger than the csv module's default limit
+            csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+def record_text(record, field, default=""):
+    """
+    A field of an imported record as a string: JSON Lines values may be
+    numbers, null, etc., but search and paste expect text.
+    """
+    value = record.get(field)
+    if value is None or value == "":
+        return default
+    return value if isinstance(value, str) else str(value)
+
 class DataHandler:
-    def __init__(self, data_file=DATA_FILE):
+    def __init__(self, data_file=DATA_FILE, storage="json", write_delay=WRITE_BEHIND_DELAY):
         self.data_file = data_file
+        self.storage = create_storage(storage, data_file)
+        # True when load_data() items carry no 'content'; use read_content()
+        self.lazy_content = getattr(self.storage, 'lazy_content', False)
+        # In-memory store keyed by template id (insertion order = file order)
+        self._items = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        # Bumped on every change to the templates (ours or on disk), so
+        # views can tell whether they need to refresh
+        self.version = 0
+
+        # Write-behind: ids changed/removed since the last write. 0 = write inline.
+        self.write_delay = write_delay
+        self._pending_changed = set()
+        self._pending_removed = set()
+        self._writing = False
+        self._write_cond = threading.Condition(self._lock)
+        self._writer = None
         self.ensure_data_file()
 
     def ensure_data_file(self):
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
+        self.storage.ensure()
 
-    def load_data(self):
+    def _ensure_loaded(self):
+        """
+        Re-parses storage only when it changed on disk since the last load/save.
+        Never while our own writes are pending: memory is newer than disk then.
+        Returns the id-level diff when it reloaded, else None.
+        """
+        if self._loaded and (self._dirty() or not self.storage.changed_on_disk()):
+            return None
+        return self._reload()
+
+    def _reload(self):
+        """
+        Reads storage and diffs it against memory by id. Unchanged templates
+        keep their existing dict, so holders of it (search index) skip them.
+        """
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
-        except Exception as e:
-            print(f"Error loading data: {e}")
-            return []
+            loaded = self.storage.load()
+        except StorageReadError as e:
+            # Likely caught mid-write by another program: keep what we have
+            # (reading it as empty would drop every template on the next
+            # save) and try again on the next change
+            print(f"Error loading data, keeping the current templates: {e}")
+            return None
+        old = self._items
+        items = {}
+        added = []
+        changed = []
+        for item in loaded:
+            item_id = item.get('id') or str(uuid.uuid4())
+            item['id'] = item_id
+            previous = old.get(item_id)
+            if previous is None:
+                added.append(item)
+            elif previous == item:
+                item = previous
+            else:
+                changed.append(item)
+            items[item_id] = item
+        removed = [item_id for item_id in old if item_id not in items]
+        self._items = items
+        if not self._loaded or added or changed or removed:
+            self.version += 1
+        self._loaded = True
+        return {"added": added, "changed": changed, "removed": removed}
 
-    def save_data(self, data):
+    def _dirty(self):
+        return self._writing or bool(self._pending_changed or self._pending_removed)
+
+    def _persist(self, changed=(), removed=()):
+        if self.write_delay <= 0:
+            self.storage.commit(list(self._items.values()), changed=changed, removed=removed)
+            self._adopt_stored(changed)
+            return
+        for item in changed:
+            self._pending_changed.add(item['id'])
+        for item_id in removed:
+            self._pending_changed.discard(item_id)
+            self._pending_removed.add(item_id)
+        self._start_writer()
+        self._write_cond.notify_all()
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._writer_loop, name="DataWriter", daemon=True)
+            self._writer.start()
+            # Pending writes must not be lost when the interpreter exits
+            atexit.register(self.flush)
+
+    def _writer_loop(self):
+        while True:
+            with self._lock:
+                while not (self._pending_changed or self._pending_removed):
+                    self._write_cond.wait()
+            # Coalescing window: let further edits join this write
+            threading.Event().wait(self.write_delay)
+            self._write_pending()
+
+    def _write_pending(self):
+        """
+        Writes everything pending in one storage commit. Only one write runs
+        at a time; the GUI thread never waits for it unless it flushes.
+        """
+        with self._lock:
+            while self._writing:
+                self._write_cond.wait()
+            if not (self._pending_changed or self._pending_removed):
+                return
+            changed = [self._items[i] for i in self._pending_changed if i in self._items]
+            removed = list(self._pending_removed)
+            items = list(self._items.values())
+            self._pending_changed = set()
+            self._pending_removed = set()
+            self._writing = True
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"Error saving data: {e}")
+            self.storage.commit(items, changed=changed, removed=removed)
+        finally:
+            with self._lock:
+                self._adopt_stored(changed)
+                self._writing = False
+                self._write_cond.notify_all()
+
+    def _adopt_stored(self, written):
+        """
+        Swaps written items for the form the storage keeps in memory (split:
+        body on disk only). Storage never edits the dicts it is given, and
+        they are replaced rather than changed here, so other threads holding
+        one never see it half-updated. Call with the lock held.
+        """
+        stored_item = getattr(self.storage, 'stored_item', None)
+        if stored_item is None:
+            return
+        for item in written:
+            item_id = item.get('id')
+            # Skip items replaced by a newer edit since this write
+            if self._items.get(item_id) is item:
+                stored = stored_item(item)
+                if stored is not None:
+                    self._items[item_id] = stored
+
+    def flush(self):
+        """
+        Blocks until every pending mutation is on disk (call at shutdown).
+        """
+        self._write_pending()
+        with self._lock:
+            while self._writing:
+                self._write_cond.wait()
+
+    def load_data(self):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._items.values())
+
+    def save_data(self, data):
+        self.flush()
+        with self._lock:
+            self._items = {}
+            for item in data:
+                item_id = item.get('id') or str(uuid.uuid4())
+                item['id'] = item_id
+                self._items[item_id] = item
+            self.storage.write_all(list(self._items.values()))
+            self._adopt_stored(list(self._items.values()))
+            self._loaded = True
+            self.version += 1
+
+    def current_version(self):
+        """
+        Returns the templates version, picking up changes made on disk.
+        Cheap when nothing changed (no file is parsed).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self.version
+
+    def reload_changes(self):
+        """
+        Picks up changes made to storage by someone else (sync tools,
+        scripts). Returns {"base", "version", "added", "changed", "removed"}
+        (added/changed are items, removed are ids; base/version are the
+        versions before and after) or None when nothing changed.
+        """
+        with self._lock:
+            base = self.version
+            diff = self._ensure_loaded()
+            if diff is None or self.version == base:
+                return None
+            diff["base"] = base
+            diff["version"] = self.version
+            return diff
+
+    def watch_paths(self):
+        """
+        Files a watcher should observe for external changes.
+        """
+        return self.storage.watch_paths()
+
+    def get_template(self, item_id):
+        with self._lock:
+            self._ensure_loaded()
+            return self._items.get(item_id)
+
+    def read_content(self, item):
+        """
+        Returns the body of a template item, reading it from storage if the
+        backend keeps bodies out of memory.
+        """
+        content = item.get('content')
+        if content is not None:
+            return content
+        reader = getattr(self.storage, 'read_content', None)
+        return reader(item) if reader else ""
+
+    def get_content(self, item_id):
+        item = self.get_template(item_id)
+        return self.read_content(item) if item is not None else None
 
     def add_template(self, title, content, category="General"):
-        data = self.load_data()
-        new_item = {
-            "id": str(uuid.uuid4()),
-            "title": title,
-            "content": content,
-            "category": category,
-            "timestamp":  datetime.datetime.now().isoformat()
-        }
-        data.append(new_item)
-        self.save_data(data)
-        return new_item
+        with self._lock:
+            self._ensure_loaded()
+            new_item = {
+                "id": str(uuid.uuid4()),
+                "title": title,
+                "content": content,
+                "category": category,
+                "timestamp":  datetime.datetime.now().isoformat()
+            }
+            self._items[new_item['id']] = new_item
+            self.version += 1
+            self._persist(changed=[new_item])
+            return new_item
 
     def update_template(self, item_id, title, content, category):
-        data = self.load_data()
-        for item in data:
-            if item.get('id') == item_id:
-                item['title'] = title
-                item['content'] = content
-                item['category'] = category
-                item['timestamp'] = datetime.datetime.now().isoformat()
-                break
-        self.save_data(data)
+        with self._lock:
+            self._ensure_loaded()
+            old = self._items.get(item_id)
+            if old is None:
+                return
+            # Replace rather than mutate, so holders of the old dict (search
+            # index, worker threads) can tell it changed
+            item = dict(old)
+            item['title'] = title
+            item['content'] = content
+            item['category'] = category
+            item['timestamp'] = datetime.datetime.now().isoformat()
+            self._items[item_id] = item
+            self.version += 1
+            self._persist(changed=[item])
 
     def delete_template(self, item_id):
-        data = self.load_data()
-        data = [item for item in data if item.get('id') != item_id]
-        self.save_data(data)
+        with self._lock:
+            self._ensure_loaded()
+            if self._items.pop(item_id, None) is None:
+                return
+            self.version += 1
+            self._persist(removed=[item_id])
+
+    def import_templates(self, path, fmt=None, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        """
+        Streams records from a JSON Lines/CSV file into the store. Records are
+        inserted in batches and written with a single storage commit at the
+        end. Records with an existing id replace that template.
+        Returns {"count", "seconds", "per_second"}.
+        """
+        start = time.perf_counter()
+        self.flush()
+        imported = {}
+        batch = []
+
+        def insert(batch):
+            with self._lock:
+                for item in batch:
+                    self._items[item['id']] = item
+                    imported[item['id']] = item
+                self.version += 1
+            if progress:
+                progress(len(imported))
+
+        with self._lock:
+            self._ensure_loaded()
+        now = datetime.datetime.now().isoformat()
+        for record in iter_records(path, fmt):
+            batch.append({
+                "id": record_text(record, 'id') or str(uuid.uuid4()),
+                "title": record_text(record, 'title'),
+                "content": record_text(record, 'content'),
+                "category": record_text(record, 'category', "General"),
+                "timestamp": record_text(record, 'timestamp', now)
+            })
+            if len(batch) >= batch_size:
+                insert(batch)
+                batch = []
+        if batch:
+            insert(batch)
+
+        with self._lock:
+            self.storage.commit(list(self._items.values()), changed=list(imported.values()))
+            self._adopt_stored(list(imported.values()))
+        seconds = time.perf_counter() - start
+        return {"count": len(imported), "seconds": seconds, "per_second": len(imported) / seconds if seconds else 0.0}
+
+    def export_templates(self, path, fmt=None):
+        """
+        Writes every template to a JSON Lines/CSV file one record at a time
+        (bodies are read one by one for lazy storage).
+        Returns {"count", "seconds", "per_second"}.
+        """
+        start = time.perf_counter()
+        fmt = fmt or detect_format(path)
+        count = 0
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS) if fmt == "csv" else None
+            if writer:
+                writer.writeheader()
+            for item in self.load_data():
+                record = {field: item.get(field, "") for field in EXPORT_FIELDS}
+                record['content'] = self.read_content(item)
+                if writer:
+                    writer.writerow(record)
+                else:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        seconds = time.perf_counter() - start
+        return {"count": count, "seconds": seconds, "per_second": count / seconds if seconds else 0.0}
 
     def get_categories(self):
-        data = self.load_data()
-        categories = set()
-        for item in data:
-            cat = item.get('category')
-            if cat:
-                categories.add(cat)
+        with self._lock:
+            self._ensure_loaded()
+            categories = set()
+            for item in self._items.values():
+                cat = item.get('category')
+                if cat:
+                    categories.add(cat)
         # Ensure standard options are present or handled in UI
         return sorted(list(categories))
@@ -0,0 +1,295 @@
+"""
+Watches the template files for changes made by other programs (sync
+tools, scripts). Uses inotify on Linux and ReadDirectoryChangesW on
+Windows; both block until something happens, so an idle watcher never
+wakes up. Polling os.stat() is only used where neither exists, and only
+when asked for. Bursts of writes are debounced into one on_change() call.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# Wait this long after the last write before reporting (seconds)
+WATCH_DEBOUNCE = 0.2
+# ...but report at most this long after the first one, even if writes continue
+WATCH_MAX_DELAY = 2.0
+# Stat-polling interval when there are no change notifications
+WATCH_POLL_INTERVAL = 1.0
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+IN_EVENT_HEADER = struct.Struct("iIII")
+# Files are often replaced by rename (os.replace), so the directories are watched
+IN_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# ReadDirectoryChangesW
+FILE_LIST_DIRECTORY = 0x0001
+FILE_SHARE_ALL = 0x00000007 # read | write | delete
+OPEN_EXISTING = 3
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000 # needed to open a directory
+FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+FILE_NOTIFY_CHANGE_SIZE = 0x00000008
+FILE_NOTIFY_CHANGE_LAST_WRITE = 0x00000010
+WIN_WATCH_MASK = FILE_NOTIFY_CHANGE_FILE_NAME | FILE_NOTIFY_CHANGE_SIZE | FILE_NOTIFY_CHANGE_LAST_WRITE
+# FILE_NOTIFY_INFORMATION: NextEntryOffset, Action, FileNameLength, then UTF-16 name
+WIN_EVENT_HEADER = struct.Struct("III")
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    except OSError:
+        return None
+
+class FileWatcher:
+    """
+    Calls on_change() from its own thread after any of `paths` changed.
+    With poll=False (default) nothing is watched on platforms without
+    change notifications; `method` is then None.
+    """
+    def __init__(self, paths, on_change, debounce=WATCH_DEBOUNCE, interval=WATCH_POLL_INTERVAL, poll=False):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.on_change = on_change
+        self.debounce = debounce
+        self.interval = interval
+        self.poll = poll
+        self._stop = threading.Event()
+        self._threads = []
+        self._names = {} # inotify watch descriptor -> watched file names
+        self._wake = None # inotify: pipe written by stop()
+        self._handles = [] # Windows: open directory handles
+        self._kernel32 = None
+        # Debounce state, shared by the reader threads
+        self._cond = threading.Condition()
+        self._first = None
+        self._last = None
+        self.method = None
+
+    def _directories(self):
+        """
+        {directory: {file names in it}}
+        """
+        dirs = {}
+        for p in self.paths:
+            dirs.setdefault(os.path.dirname(p), set()).add(os.path.basename(p))
+        return dirs
+
+    def start(self):
+        if self._threads:
+            return
+        readers = None
+        if sys.platform.startswith("linux"):
+            readers = self._inotify_readers()
+            self.method = "inotify" if readers else None
+        elif sys.platform == "win32":
+            readers = self._windows_readers()
+            self.method = "ReadDirectoryChangesW" if readers else None
+        if not readers:
+            if not self.poll:
+                print("No file change notifications on this system; not watching template files")
+                return
+            self.method = "polling"
+            readers = [self._run_polling]
+        else:
+            readers.append(self._run_debounce)
+        for target in readers:
+            thread = threading.Thread(target=target, name="FileWatcher", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._wake is not None:
+            try:
+                os.write(self._wake[1], b"x")
+            except OSError:
+                pass
+        for handle in self._handles:
+            # Ends the blocking ReadDirectoryChangesW call
+            self._kernel32.CancelIoEx(handle, None)
+
+    def _notify(self):
+        try:
+            self.on_change()
+        except Exception as e:
+            print(f"Error handling file change: {e}")
+
+    def _changed(self):
+        # Reader threads: note a relevant write; _run_debounce reports it
+        with self._cond:
+            now = time.monotonic()
+            if self._first is None:
+                self._first = now
+            self._last = now
+            self._cond.notify()
+
+    def _run_debounce(self):
+        with self._cond:
+            while not self._stop.is_set():
+                if self._first is None:
+                    # Idle: sleep until a reader reports a write
+                    self._cond.wait()
+                    continue
+                due = min(self._last + self.debounce, self._first + WATCH_MAX_DELAY)
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                self._first = self._last = None
+                self._cond.release()
+                try:
+                    self._notify()
+                finally:
+                    self._cond.acquire()
+
+    def _inotify_readers(self):
+        """
+        Returns the reader for an inotify fd watching the directories of
+        self.paths, or None if inotify can't be used.
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_CLOEXEC)
+            if fd < 0:
+                return None
+            self._names = {}
+            for directory, names in self._directories().items():
+                wd = libc.inotify_add_watch(fd, os.fsencode(directory), IN_WATCH_MASK)
+                if wd < 0:
+                    os.close(fd)
+                    return None
+                self._names[wd] = {os.fsencode(name) for name in names}
+            self._wake = os.pipe()
+            return [lambda: self._run_inotify(fd)]
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable: {e}")
+            return None
+
+    def _read_events(self, fd):
+        """
+        Reads pending inotify events; True if one concerns a watched file.
+        """
+        data = os.read(fd, 64 * 1024)
+        relevant = False
+        offset = 0
+        while offset + IN_EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += IN_EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name in self._names.get(wd, ()):
+                relevant = True
+        return relevant
+
+    def _run_inotify(self, fd):
+        wake = self._wake[0]
+        try:
+            while True:
+                # No timeout: stop() wakes us through the pipe
+                readable, _, _ = select.select([fd, wake], [], [])
+                if wake in readable:
+                    return
+                if self._read_events(fd):
+                    self._changed()
+        except Exception as e:
+            print(f"File watcher error: {e}")
+        finally:
+            os.close(fd)
+            os.close(self._wake[0])
+            os.close(self._wake[1])
+
+    def _windows_readers(self):
+        """
+        Returns one reader per watched directory, or None if the
+        directories can't be opened for change notifications.
+        """
+        try:
+            from ctypes import wintypes
+            kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+            kernel32.CreateFileW.restype = wintypes.HANDLE
+            kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                             wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+            kernel32.ReadDirectoryChangesW.restype = wintypes.BOOL
+            kernel32.ReadDirectoryChangesW.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD, wintypes.BOOL,
+                                                       wintypes.DWORD, ctypes.POINTER(wintypes.DWORD),
+                                                       wintypes.LPVOID, wintypes.LPVOID]
+            kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, wintypes.LPVOID]
+            kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+            invalid = wintypes.HANDLE(-1).value
+            self._kernel32 = kernel32
+            readers = []
+            for directory, names in self._directories().items():
+                handle = kernel32.CreateFileW(directory, FILE_LIST_DIRECTORY, FILE_SHARE_ALL, None,
+                                              OPEN_EXISTING, FILE_FLAG_BACKUP_SEMANTICS, None)
+                if not handle or handle == invalid:
+                    for opened in self._handles:
+                        kernel32.CloseHandle(opened)
+                    self._handles = []
+                    return None
+                self._handles.append(handle)
+                # File names are case-insensitive on Windows
+                lowered = {name.lower() for name in names}
+                readers.append(lambda handle=handle, lowered=lowered: self._run_windows(handle, lowered))
+            return readers
+        except (OSError, AttributeError) as e:
+            print(f"ReadDirectoryChangesW unavailable: {e}")
+            return None
+
+    @staticmethod
+    def _windows_relevant(data, names):
+        offset = 0
+        while offset + WIN_EVENT_HEADER.size <= len(data):
+            next_offset, action, length = WIN_EVENT_HEADER.unpack_from(data, offset)
+            start = offset + WIN_EVENT_HEADER.size
+            if data[start:start + length].decode('utf-16-le', errors='replace').lower() in names:
+                return True
+            if not next_offset:
+                break
+            offset += next_offset
+        return False
+
+    def _run_windows(self, handle, names):
+        from ctypes import wintypes
+        buffer = ctypes.create_string_buffer(64 * 1024)
+        returned = wintypes.DWORD()
+        try:
+            while not self._stop.is_set():
+                # Blocks until something in the directory changes
+                ok = self._kernel32.ReadDirectoryChangesW(handle, buffer, len(buffer), False, WIN_WATCH_MASK,
+                                                          ctypes.byref(returned), None, None)
+                if not ok:
+                    return # Cancelled by stop(), or the directory went away
+                # 0 bytes: more changes than fit the buffer; assume ours was one
+                if returned.value == 0 or self._windows_relevant(buffer.raw[:returned.value], names):
+                    self._changed()
+        except Exception as e:
+            print(f"File watcher error: {e}")
+        finally:
+            self._kernel32.CloseHandle(handle)
+
+    def _run_polling(self):
+        last = [_stamp(p) for p in self.paths]
+        pending = False
+        while not self._stop.wait(self.debounce if pending else self.interval):
+            current = [_stamp(p) for p in self.paths]
+            if current != last:
+                # Still being written; report once it has settled
+                last = current
+                pending = True
+            elif pending:
+                pending = False
+                self._notify()
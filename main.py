@@ -1,18 +1,19 @@
-import customtkinter as ctk
-import tkinter as tk
-from tkinter import messagebox
-import keyboard
+import time
+# Reference point for --profile-startup
+STARTUP_TIME = time.perf_counter()
+import argparse
 import threading
-import socket
 import sys
 import queue
 import logging
 import traceback
-import json
-import os
-from ui import MainWindow, SaveWindow
-from clipboard_manager import ClipboardManager
+from clipboard_backends import create_clipboard_backend, serve_helper, HELPER_ARG
+from single_instance import SingleInstance
+import metrics
 import utils
+# keyboard and clipboard_manager are imported in ClipboardApp.__init__, so
+# a second launch that only forwards a command stays fast. The GUI,
+# storage and file watcher modules follow once the hotkeys are live.
 
 # Setup logging
 logging.basicConfig(
@@ -29,66 +30,195 @@ def handle_exception(exc_type, exc_value, exc_traceback):
 
 sys.excepthook = handle_exception
 
-class ClipboardApp:
+PROFILE_ARG = "--profile-startup"
+# Quit as soon as startup finished (used by `build.py --benchmark`)
+EXIT_AFTER_STARTUP_ARG = "--exit-after-startup"
+
+# Virtual event that tells the Tk thread the event queue has something in it
+QUEUE_EVENT = "<<ClipboardAppQueue>>"
+
+class WakeupQueue(queue.Queue):
+    """
+    Queue that calls `wakeup` after every put, so the GUI thread can be
+    woken immediately instead of polling.
+    """
     def __init__(self):
+        super().__init__()
+        self.wakeup = None
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        if self.wakeup:
+            self.wakeup()
+
+class ClipboardApp:
+    def __init__(self, instance=None, profile=None, exit_after_startup=False):
+        # Hotkeys go live first; the GUI and data are set up after that.
+        # Hotkey presses meanwhile wait in the queue until the loop runs.
+        self.profile = profile or metrics.StartupProfile()
+        self.exit_after_startup = exit_after_startup
         try:
-            self.enforce_single_instance()
-            self.clipboard_manager = ClipboardManager()
+            self.profile.phase("imports")
+            self.enforce_single_instance(instance)
+            import keyboard
+            from clipboard_manager import ClipboardManager, ClipboardHistory, ClipboardMonitor
+            self.config = utils.load_config()
+
+            # Optional latency tracing (config: "metrics": true)
+            if self.config.get("metrics"):
+                metrics.configure(
+                    path=self.config.get("metrics_file", metrics.METRICS_FILE),
+                    interval=self.config.get("metrics_interval", 300)
+                )
             
             # Queue for thread-safe communication
-            self.event_queue = queue.Queue()
-            
-            self.app = MainWindow(on_paste_callback=self.paste_template, on_edit_callback=self.edit_template_action)
-            self.app.withdraw() # Start hidden
-            
-            # Initialize SaveWindow persistent instance
-            self.save_window = SaveWindow(self.app, on_save_callback=self.app.refresh_list)
-            self.save_window.withdraw()
-
-            # First Run Check
-            self.check_first_run()
+            self.event_queue = WakeupQueue()
+            # Commands forwarded by later launches (main.py --show-paste etc.)
+            self.instance.serve(self.handle_remote_command)
+            self.profile.phase("config")
 
             # Hotkeys
             self.PASTE_HOTKEY = 'alt+v'
             self.SAVE_HOTKEY = 'ctrl+shift+s'
             
             # Use lambda to put events in queue, avoiding direct GUI calls from thread
-            keyboard.add_hotkey(self.PASTE_HOTKEY, lambda: self.event_queue.put("show_paste"))
-            keyboard.add_hotkey(self.SAVE_HOTKEY, lambda: self.event_queue.put("show_save"))
+            keyboard.add_hotkey(self.PASTE_HOTKEY, lambda: self.on_hotkey("show_paste"))
+            keyboard.add_hotkey(self.SAVE_HOTKEY, lambda: self.on_hotkey("show_save"))
+            if metrics.enabled() and self.config.get("metrics_hotkey"):
+                keyboard.add_hotkey(self.config["metrics_hotkey"], lambda: self.event_queue.put("dump_metrics"))
+            self.profile.phase("hotkeys")
+
+            from ui import MainWindow
+            from data_handler import DataHandler
+            from usage import UsageTracker
+            self.profile.phase("gui_imports")
+
+            # Storage backend: "json" (default), "journal", "sqlite" or "split".
+            # Nothing is read until the list is first filled.
+            self.data_handler = DataHandler(storage=self.config.get("storage", "json"))
+
+            # Use counters for ranking the list (config: "frecency", default on)
+            self.usage = UsageTracker() if self.config.get("frecency", True) else None
+
+            # Optional clipboard history (config: "clipboard_history": true)
+            self.history = None
+            if self.config.get("clipboard_history"):
+                self.history = ClipboardHistory(
+                    max_items=self.config.get("history_max_items", 200),
+                    max_bytes=self.config.get("history_max_bytes", 2 * 1024 * 1024)
+                )
+            
+            # The list itself is filled once the event loop is idle
+            self.app = MainWindow(
+                on_paste_callback=self.paste_template,
+                on_edit_callback=self.edit_template_action,
+                data_handler=self.data_handler,
+                event_queue=self.event_queue,
+                history=self.history,
+                usage=self.usage
+            )
+            self.app.withdraw() # Start hidden
+            self.profile.phase("main_window")
+
+            # Clipboard backend: "tk" (default, in-process), "helper" or "pyperclip"
+            self.clipboard_manager = ClipboardManager(
+                backend=create_clipboard_backend(self.config.get("clipboard_backend", "tk"), root=self.app),
+                restore_clipboard=self.config.get("restore_clipboard", False)
+            )
+            self.clipboard_monitor = None
+            if self.history is not None:
+                # The clipboard is read on the Tk thread (see "clipboard_changed")
+                self.clipboard_monitor = ClipboardMonitor(
+                    self.clipboard_manager, self.history,
+                    on_change=lambda: self.event_queue.put("history_changed"),
+                    schedule_check=lambda: self.event_queue.put("clipboard_changed")
+                )
             
+            # SaveWindow is built on first use (see get_save_window)
+            self.save_window = None
+
+            # First Run Check
+            self.check_first_run()
+            
+            if self.clipboard_monitor:
+                self.clipboard_monitor.start()
+
+            # Optional JSON-RPC server for scripts (config: "rpc_server": true)
+            self.rpc_server = None
+            self._rpc_refresh_queued = False
+            if self.config.get("rpc_server"):
+                self.start_rpc_server()
+
+            # Pick up edits made to the template files by other programs
+            self.file_watcher = None
+            if self.config.get("watch_templates", True):
+                from file_watcher import FileWatcher
+                # "poll": also stat-poll where there are no change notifications
+                self.file_watcher = FileWatcher(
+                    self.data_handler.watch_paths(), self.on_templates_changed,
+                    poll=self.config.get("watch_templates") == "poll"
+                )
+                self.file_watcher.start()
+
             print(f"App running... Hotkeys: Paste=[{self.PASTE_HOTKEY}], Save=[{self.SAVE_HOTKEY}]")
             
-            # Start checking queue
-            self.check_queue()
+            # Wake the GUI thread on every queued event (no periodic polling)
+            self.setup_event_wakeup()
+            self.profile.phase("background")
         except Exception as e:
             logging.error(f"Initialization error: {e}")
             logging.error(traceback.format_exc())
             raise e
 
-    def enforce_single_instance(self):
-        try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.bind(('127.0.0.1', 45678)) # Arbitrary port
-        except socket.error:
-            print("⚠️ ERROR: The application is already running!")
-            print("Please close the existing instance (or hidden process) first.")
-            if sys.stdin and sys.stdout: # Only exit if run interactively, though logging catches it
-                 sys.exit(1)
-            else:
-                 sys.exit(1)
+    def enforce_single_instance(self, instance=None):
+        # `instance` has already been acquired by the __main__ block
+        if instance is None:
+            instance = SingleInstance()
+            if not instance.acquire():
+                print("⚠️ ERROR: The application is already running!")
+                print("Please close the existing instance (or hidden process) first.")
+                sys.exit(1)
+        self.instance = instance
 
-    def check_first_run(self):
-        config_file = "config.json"
-        
-        # Load or Create Config
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-            except:
-                config = {}
+    def start_rpc_server(self):
+        from rpc_server import RpcServer, TemplateApi
+        api = TemplateApi(
+            self.data_handler,
+            # Same ranking as the list, including changes the list hasn't shown yet
+            search=self.app.search_current,
+            on_change=self.queue_rpc_refresh,
+            paste=lambda item_id: self.event_queue.put(("paste_id", item_id)),
+            # Same as deleting from the list: use counters go too
+            delete=self.app.delete_template
+        )
+        self.rpc_server = RpcServer(
+            api,
+            path=self.config.get("rpc_socket"),
+            port=self.config.get("rpc_port", 0)
+        )
+        self.rpc_server.start()
+
+    def queue_rpc_refresh(self):
+        # RPC thread: one list refresh for any number of changes in a burst
+        if not self._rpc_refresh_queued:
+            self._rpc_refresh_queued = True
+            self.event_queue.put("rpc_changed")
+
+    def handle_remote_command(self, message):
+        # SingleInstance thread: only queue work for the GUI thread
+        command = message.get("command")
+        if command == "show_paste":
+            self.event_queue.put("show_paste")
+        elif command == "save":
+            self.event_queue.put(("show_save", message.get("text")))
+        elif command == "paste":
+            self.event_queue.put(("paste_id", message.get("id")))
         else:
-            config = {}
+            return {"error": f"unknown command: {command}"}
+        return {"ok": True}
+
+    def check_first_run(self):
+        config = self.config
 
         # Check if first run
         if not config.get("setup_completed"):
@@ -100,6 +230,7 @@ class ClipboardApp:
             # Make sure main window is initialized enough to be a parent, or use a temporary hidden root
             # Since self.app exists (created in __init__), we can use it.
             
+            from tkinter import messagebox
             response = messagebox.askyesno(
                 "Initial Setup", 
                 "Do you want to start this application automatically when Windows starts?"
@@ -119,61 +250,146 @@ class ClipboardApp:
             
             # Save config
             try:
-                with open(config_file, 'w') as f:
-                    json.dump(config, f, indent=4)
+                utils.save_config(config)
             except Exception as e:
                 logging.error(f"Failed to save config: {e}")
     
+    def setup_event_wakeup(self):
+        import tkinter as tk
+        self._poll_queue = False
+        self.app.bind(QUEUE_EVENT, lambda e: self.check_queue())
+        try:
+            threaded = bool(self.app.tk.call('info', 'exists', 'tcl_platform(threaded)')) and \
+                bool(self.app.tk.call('set', 'tcl_platform(threaded)'))
+        except tk.TclError:
+            threaded = False
+        if not threaded:
+            # Non-threaded Tcl can't be called from other threads; poll instead
+            self._poll_queue = True
+            return
+
+        # event_generate from another thread blocks until Tk processes it, so
+        # it runs on a dedicated waker thread, never on the keyboard hook thread.
+        self._wake_event = threading.Event()
+        self.event_queue.wakeup = self._wake_event.set
+        threading.Thread(target=self._waker_loop, name="GuiWaker", daemon=True).start()
+
+    def _waker_loop(self):
+        import tkinter as tk
+        while True:
+            self._wake_event.wait()
+            self._wake_event.clear()
+            try:
+                self.app.event_generate(QUEUE_EVENT, when="tail")
+            except (RuntimeError, tk.TclError):
+                # Main loop not running yet; run() drains the queue on start
+                pass
+
+    def on_hotkey(self, event_type):
+        # Runs on the keyboard hook thread: start the hotkey -> visible trace
+        metrics.mark(event_type)
+        self.event_queue.put(event_type)
+
+    def on_templates_changed(self):
+        # Watcher thread: parse and diff here, off the GUI thread
+        self.event_queue.put(("templates_changed", self.data_handler.reload_changes()))
+
     def check_queue(self):
         try:
-            while True:
-                event = self.event_queue.get_nowait()
-                # Handle tuple event
-                if isinstance(event, tuple):
-                    event_type, data = event
-                    self.process_event(event_type, data)
-                else:
-                    self.process_event(event)
+            with metrics.span("app.check_queue"):
+                while True:
+                    event = self.event_queue.get_nowait()
+                    # Handle tuple event
+                    if isinstance(event, tuple):
+                        event_type, data = event
+                        self.process_event(event_type, data)
+                    else:
+                        self.process_event(event)
         except queue.Empty:
             pass
         except Exception as e:
             logging.error(f"Queue processing error: {e}")
             logging.error(traceback.format_exc())
         finally:
-            # Check again in 100ms
-            self.app.after(100, self.check_queue)
+            if self._poll_queue:
+                # Fallback for non-threaded Tcl: check again in 100ms
+                self.app.after(100, self.check_queue)
 
     def process_event(self, event_type, data=None):
         try:
-            if event_type == "show_paste":
-                self.app.reset_and_show()
-            elif event_type == "show_save":
-                self.show_save_window_action()
-            elif event_type == "edit_save":
-                self.show_edit_window_action(data)
+            with metrics.span(f"app.event.{event_type}"):
+                self._dispatch_event(event_type, data)
         except Exception as e:
              logging.error(f"Event processing error ({event_type}): {e}")
              logging.error(traceback.format_exc())
 
-    def show_save_window_action(self):
+    def _dispatch_event(self, event_type, data):
+        if event_type in ("show_paste", "show_save"):
+            # Hotkey press -> GUI thread picked it up
+            metrics.since(event_type, f"hotkey.{event_type}.queued")
+        if event_type == "show_paste":
+            self.app.reset_and_show()
+            self.finish_visible_trace(event_type)
+        elif event_type == "show_save":
+            self.show_save_window_action(data)
+            self.finish_visible_trace(event_type)
+        elif event_type == "paste_id":
+            self.paste_template_id(data)
+        elif event_type == "edit_save":
+            self.show_edit_window_action(data)
+        elif event_type == "search_results":
+            self.app.show_search_results(data)
+        elif event_type == "index_ready":
+            self.app.on_index_ready(data)
+        elif event_type == "clipboard_changed":
+            self.clipboard_monitor.check()
+        elif event_type == "history_changed":
+            self.app.on_history_changed()
+        elif event_type == "templates_changed":
+            self.app.on_templates_changed(data)
+        elif event_type == "rpc_changed":
+            self._rpc_refresh_queued = False
+            self.app.refresh_if_stale()
+        elif event_type == "dump_metrics":
+            metrics.dump()
+
+    def finish_visible_trace(self, event_type):
+        # Idle callbacks run after the pending redraws, i.e. once the window is drawn
+        if metrics.enabled():
+            self.app.after_idle(lambda: metrics.finish(event_type, f"hotkey.{event_type}.visible"))
+
+    def get_save_window(self):
+        """
+        The persistent SaveWindow, built on first use and rebuilt if it was
+        destroyed.
+        """
+        import tkinter as tk
+        from ui import SaveWindow
+        try:
+            if self.save_window is not None and self.save_window.winfo_exists():
+                return self.save_window
+        except tk.TclError:
+            pass
+        self.save_window = SaveWindow(self.app, on_save_callback=self.app.refresh_list, data_handler=self.data_handler)
+        self.save_window.withdraw()
+        return self.save_window
+
+    def show_save_window_action(self, content=None):
         try:
-            content = self.clipboard_manager.get_clipboard_text()
+            if content is None:
+                content = self.clipboard_manager.get_clipboard_text()
             
-            # Use persistent window, recreate only if dead
-            try:
-                self.save_window.winfo_exists()
-            except (tk.TclError, AttributeError):
-                 self.save_window = SaveWindow(self.app, on_save_callback=self.app.refresh_list)
+            save_window = self.get_save_window()
             
             # Reset callbacks for normal save mode (just close on finish)
-            self.save_window.on_save_callback = self.app.refresh_list
-            self.save_window.on_cancel_callback = None
+            save_window.on_save_callback = self.app.refresh_list
+            save_window.on_cancel_callback = None
 
-            self.save_window.reset_and_show(content)
+            save_window.reset_and_show(content)
             
             # Force focus
-            self.save_window.after(100, self.save_window.lift)
-            self.save_window.after(100, self.save_window.focus_force)
+            save_window.after(100, save_window.lift)
+            save_window.after(100, save_window.focus_force)
             
         except Exception as e:
             logging.error(f"Error checking queue action: {e}")
@@ -183,28 +399,25 @@ class ClipboardApp:
             # Close main window first? Preferable.
             self.app.withdraw()
 
-            try:
-                self.save_window.winfo_exists()
-            except (tk.TclError, AttributeError):
-                 self.save_window = SaveWindow(self.app, on_save_callback=self.app.refresh_list)
+            save_window = self.get_save_window()
 
             # Set callbacks to reopen main window after edit/cancel
             def on_edit_finished():
                 self.app.refresh_list()
                 self.app.reset_and_show()
 
-            self.save_window.on_save_callback = on_edit_finished
-            self.save_window.on_cancel_callback = self.app.reset_and_show
+            save_window.on_save_callback = on_edit_finished
+            save_window.on_cancel_callback = self.app.reset_and_show
 
-            self.save_window.reset_and_show(
-                content=item['content'],
+            save_window.reset_and_show(
+                content=self.app.item_content(item),
                 template_id=item['id'],
                 title=item['title'],
                 category=item['category']
             )
             
-            self.save_window.after(100, self.save_window.lift)
-            self.save_window.after(100, self.save_window.focus_force)
+            save_window.after(100, save_window.lift)
+            save_window.after(100, save_window.focus_force)
             
          except Exception as e:
             logging.error(f"Error showing edit window: {e}")
@@ -220,19 +433,89 @@ class ClipboardApp:
         except Exception as e:
             logging.error(f"Paste error: {e}")
 
+    def finish_startup(self):
+        # Idle callbacks run in order, so the list has been filled by now
+        self.profile.phase("list_populated")
+        self.profile.report()
+        if self.exit_after_startup:
+            self.app.quit()
+
+    def paste_template_id(self, item_id):
+        content = self.data_handler.get_content(item_id)
+        if content is None:
+            logging.error(f"Paste error: no template with id {item_id}")
+            return
+        if self.usage is not None:
+            self.usage.record(item_id)
+        self.paste_template(content)
+
     def run(self):
         try:
             # If start hidden, we don't necessarily show app, but we run the loop.
             # But the MessageBox in __init__ needs to be handled before or during loop?
             # Creating messagebox in __init__ blocks execution until closed, which is fine for startup check.
+            # Pick up anything queued before the loop started
+            self.app.after_idle(self.check_queue)
+            self.app.after_idle(self.finish_startup)
             self.app.mainloop()
         except Exception as e:
              logging.critical(f"Main loop crashed: {e}")
              logging.critical(traceback.format_exc())
+        finally:
+            # Write out edits still waiting in the write-behind buffer
+            self.data_handler.flush()
+            if self.usage is not None:
+                self.usage.flush()
+            metrics.dump()
+            if self.rpc_server:
+                self.rpc_server.stop()
+            self.instance.close()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Clipboard template manager. "
+                                     "If it is already running, the command is sent to that instance.")
+    parser.add_argument("--show-paste", action="store_true", help="show the template list")
+    parser.add_argument("--save", metavar="TEXT", help="open the save window with TEXT")
+    parser.add_argument("--paste", metavar="ID", help="paste the template with this id")
+    parser.add_argument(PROFILE_ARG, action="store_true", help="write startup timings to startup_profile.json")
+    parser.add_argument(EXIT_AFTER_STARTUP_ARG, action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def remote_command(args):
+    if args.paste:
+        return {"command": "paste", "id": args.paste}
+    if args.save is not None:
+        return {"command": "save", "text": args.save}
+    if args.show_paste:
+        return {"command": "show_paste"}
+    return None
 
 if __name__ == "__main__":
+    if HELPER_ARG in sys.argv:
+        # Frozen builds start the clipboard helper process through the exe
+        serve_helper()
+        sys.exit(0)
+    args = parse_args(sys.argv[1:])
+    command = remote_command(args)
+    instance = SingleInstance()
+    if not instance.acquire():
+        # Already running: hand the command over instead of starting Tk
+        try:
+            reply = instance.send(command or {"command": "show_paste"})
+        except Exception as e:
+            print(f"⚠️ ERROR: The application is already running but did not respond: {e}")
+            sys.exit(1)
+        if "error" in reply:
+            print(f"Error: {reply['error']}")
+            sys.exit(1)
+        sys.exit(0)
     try:
-        app = ClipboardApp()
+        # --profile-startup: per-phase timings to startup_profile.json
+        profile = metrics.StartupProfile(enabled=args.profile_startup, start=STARTUP_TIME)
+        app = ClipboardApp(instance=instance, profile=profile, exit_after_startup=args.exit_after_startup)
+        if command:
+            # Not running yet: start, then carry out the command
+            app.handle_remote_command(command)
         app.run()
     except Exception as e:
         logging.critical(f"Application failed to start: {e}")
@@ -0,0 +1,39 @@
+import argparse
+import sys
+from data_handler import DataHandler, DATA_FILE
+import utils
+
+def print_stats(action, stats):
+    print(f"{action} {stats['count']} templates in {stats['seconds']:.2f}s ({stats['per_second']:,.0f}/s)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of templates (JSON Lines or CSV).")
+    parser.add_argument("--data-file", default=DATA_FILE, help="templates file (default: %(default)s)")
+    parser.add_argument("--storage", default=None, help="storage backend (default: config.json or json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="import records from a .jsonl/.csv file")
+    p_import.add_argument("path")
+    p_import.add_argument("--format", choices=["jsonl", "csv"], default=None)
+    p_import.add_argument("--batch-size", type=int, default=10000)
+
+    p_export = sub.add_parser("export", help="export all templates to a .jsonl/.csv file")
+    p_export.add_argument("path")
+    p_export.add_argument("--format", choices=["jsonl", "csv"], default=None)
+
+    args = parser.parse_args(argv)
+    storage = args.storage or utils.load_config().get("storage", "json")
+    handler = DataHandler(data_file=args.data_file, storage=storage, write_delay=0)
+
+    if args.command == "import":
+        def progress(count):
+            print(f"\r  {count:,} records...", end="", file=sys.stderr)
+        stats = handler.import_templates(args.path, fmt=args.format, batch_size=args.batch_size, progress=progress)
+        print(file=sys.stderr)
+        print_stats("Imported", stats)
+    else:
+        stats = handler.export_templates(args.path, fmt=args.format)
+        print_stats("Exported", stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Optional latency tracing. Spans are recorded into per-name histograms that
+can be dumped on demand or written periodically to a rotating metrics file.
+Everything is a no-op until configure(enabled=True) is called.
+StartupProfile times the startup phases for --profile-startup.
+"""
+import json
+import time
+import datetime
+import functools
+import threading
+import logging
+import logging.handlers
+from collections import deque
+
+METRICS_FILE = "metrics.log"
+STARTUP_PROFILE_FILE = "startup_profile.json"
+METRICS_MAX_BYTES = 1024 * 1024
+METRICS_BACKUP_COUNT = 3
+# Recent samples kept per span name for the percentiles
+METRICS_MAX_SAMPLES = 2048
+
+_enabled = False
+_samples = {}   # name -> deque of seconds
+_counts = {}    # name -> total number of samples ever recorded
+_marks = {}     # name -> perf_counter() of an operation in flight
+_lock = threading.Lock()
+_logger = None
+_dumper = None
+_stop = threading.Event()
+
+def enabled():
+    return _enabled
+
+def configure(enabled=True, path=METRICS_FILE, interval=None):
+    """
+    Turns tracing on. With `interval` (seconds) a snapshot is appended to
+    `path` that often; dump() writes one at any time.
+    """
+    global _enabled, _logger, _dumper
+    _enabled = enabled
+    if not enabled:
+        _stop.set()
+        return
+    if _logger is None:
+        _logger = logging.getLogger("clipboard_metrics")
+        _logger.setLevel(logging.INFO)
+        # Metrics stay out of app.log
+        _logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=METRICS_MAX_BYTES, backupCount=METRICS_BACKUP_COUNT, encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+    if interval and _dumper is None:
+        _stop.clear()
+        _dumper = threading.Thread(target=_dump_loop, args=(interval,), name="MetricsDumper", daemon=True)
+        _dumper.start()
+
+def _dump_loop(interval):
+    while not _stop.wait(interval):
+        dump()
+
+def record(name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=METRICS_MAX_SAMPLES)
+        samples.append(seconds)
+        _counts[name] = _counts.get(name, 0) + 1
+
+class span:
+    """
+    Times a block: `with metrics.span("ui.refresh_list"): ...`
+    """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start)
+        return False
+
+def traced(name):
+    """
+    Decorator form of span().
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def mark(name):
+    """
+    Notes the start of an operation that finishes on another thread or in a
+    later event (e.g. hotkey press -> window visible).
+    """
+    if _enabled:
+        _marks[name] = time.perf_counter()
+
+def since(mark_name, name):
+    """
+    Records the time since mark(mark_name) under `name`, keeping the mark.
+    """
+    start = _marks.get(mark_name)
+    if _enabled and start is not None:
+        record(name, time.perf_counter() - start)
+
+def finish(mark_name, name):
+    """
+    Records the time since mark(mark_name) under `name` and clears the mark.
+    """
+    start = _marks.pop(mark_name, None)
+    if _enabled and start is not None:
+        record(name, time.perf_counter() - start)
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def snapshot():
+    """
+    Returns {name: {"count", "p50_ms", "p95_ms", "p99_ms", "max_ms"}} over
+    the most recent samples of each span.
+    """
+    with _lock:
+        copies = {name: sorted(samples) for name, samples in _samples.items()}
+        counts = dict(_counts)
+    result = {}
+    for name, ordered in sorted(copies.items()):
+        if not ordered:
+            continue
+        result[name] = {
+            "count": counts[name],
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+    return result
+
+def dump():
+    """
+    Appends the current snapshot as one JSON line to the metrics file.
+    """
+    if not _enabled or _logger is None:
+        return None
+    stats = snapshot()
+    try:
+        _logger.info(json.dumps({"timestamp": datetime.datetime.now().isoformat(), "spans": stats}, ensure_ascii=False))
+    except Exception as e:
+        print(f"Error writing metrics: {e}")
+    return stats
+
+
+class StartupProfile:
+    """
+    Per-phase startup timings for --profile-startup. phase(name) closes the
+    phase that started at the previous call; report() writes them as JSON
+    (the built exe has no console) and prints a summary.
+    """
+    def __init__(self, enabled=False, start=None):
+        self.enabled = enabled
+        self.start = start if start is not None else time.perf_counter()
+        self._last = self.start
+        self.phases = []
+        # Wall-clock time of each phase end, so an external launcher can
+        # measure from process creation
+        self.wall_clock = {}
+
+    def phase(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append({
+            "phase": name,
+            "ms": round((now - self._last) * 1000, 3),
+            "at_ms": round((now - self.start) * 1000, 3),
+        })
+        self.wall_clock[name] = time.time()
+        self._last = now
+
+    def report(self, path=STARTUP_PROFILE_FILE):
+        if not self.enabled:
+            return
+        data = {
+            "phases": self.phases,
+            "wall_clock": self.wall_clock,
+            "total_ms": self.phases[-1]["at_ms"] if self.phases else 0.0,
+        }
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            print(f"Error writing startup profile: {e}")
+        for entry in self.phases:
+            print(f"{entry['phase']:<20} {entry['ms']:>9.1f} ms  (at {entry['at_ms']:.1f} ms)")
@@ -0,0 +1,315 @@
+"""
+Opt-in local JSON-RPC 2.0 server for scripts (config: "rpc_server": true).
+
+One request or response per line. Connections stay open and requests can
+be pipelined: responses come back in request order. Batches (JSON arrays)
+and notifications (no "id") work as in the spec.
+
+Transport: a Unix domain socket readable by this user only. Where Unix
+sockets are unavailable (Windows) it listens on 127.0.0.1 instead, and
+each connection must first call "auth" with the token from the endpoint
+file. The endpoint file (rpc_endpoint.json) tells clients where to
+connect.
+
+Methods:
+    search(query="", limit=20)   -> [{id, title, category, timestamp}, ...]
+    get(id)                      -> template with content, or null
+    add(title, content, category="General") -> new template
+    update(id, title=None, content=None, category=None) -> true/false
+    delete(id)                   -> true/false
+    paste(id)                    -> true/false (pastes into the focused window)
+"""
+import asyncio
+import inspect
+import json
+import os
+import secrets
+import sys
+import tempfile
+import threading
+
+RPC_ENDPOINT_FILE = "rpc_endpoint.json"
+RPC_SEARCH_LIMIT = 20
+# Longest accepted request line
+RPC_MAX_LINE = 16 * 1024 * 1024
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+UNAUTHORIZED = -32001
+
+def default_socket_path():
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(base, f"ClipboardManager-{os.getuid()}.rpc.sock")
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _check_text(name, value, optional=False):
+    # Stored fields must be strings: search and paste assume so
+    if value is None and optional:
+        return
+    if not isinstance(value, str):
+        raise RpcError(INVALID_PARAMS, f"{name} must be a string")
+
+
+class TemplateApi:
+    """
+    The RPC methods. They run on the server thread against the live
+    DataHandler; anything touching the GUI goes through callbacks that
+    queue work for the Tk thread.
+    """
+    def __init__(self, data_handler, search, on_change=None, paste=None, delete=None):
+        self.data_handler = data_handler
+        self._search = search
+        self._on_change = on_change
+        self._paste = paste
+        self._delete = delete or data_handler.delete_template
+
+    def _changed(self):
+        if self._on_change:
+            self._on_change()
+
+    def search(self, query="", limit=RPC_SEARCH_LIMIT):
+        _check_text("query", query)
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+            raise RpcError(INVALID_PARAMS, "limit must be a positive integer")
+        results = self._search(query.lower(), limit)
+        return [
+            {field: item.get(field) for field in ("id", "title", "category", "timestamp")}
+            for item in results[:limit]
+        ]
+
+    def get(self, id):
+        _check_text("id", id)
+        item = self.data_handler.get_template(id)
+        if item is None:
+            return None
+        result = dict(item)
+        result['content'] = self.data_handler.read_content(item)
+        result.pop('blob', None)
+        return result
+
+    def add(self, title, content, category="General"):
+        _check_text("title", title)
+        _check_text("content", content)
+        _check_text("category", category, optional=True)
+        item = self.data_handler.add_template(title, content, category or "General")
+        self._changed()
+        return item
+
+    def update(self, id, title=None, content=None, category=None):
+        _check_text("id", id)
+        for name, value in (("title", title), ("content", content), ("category", category)):
+            _check_text(name, value, optional=True)
+        item = self.data_handler.get_template(id)
+        if item is None:
+            return False
+        self.data_handler.update_template(
+            id,
+            item.get('title', '') if title is None else title,
+            self.data_handler.read_content(item) if content is None else content,
+            item.get('category', 'General') if category is None else category
+        )
+        self._changed()
+        return True
+
+    def delete(self, id):
+        _check_text("id", id)
+        if self.data_handler.get_template(id) is None:
+            return False
+        self._delete(id)
+        self._changed()
+        return True
+
+    def paste(self, id):
+        _check_text("id", id)
+        if self._paste is None or self.data_handler.get_template(id) is None:
+            return False
+        self._paste(id)
+        return True
+
+
+class RpcServer:
+    """
+    asyncio server on its own thread, dispatching to the public methods
+    of `api`.
+    """
+    def __init__(self, api, path=None, host="127.0.0.1", port=0, endpoint_file=RPC_ENDPOINT_FILE):
+        self.api = api
+        self.use_unix = hasattr(asyncio, 'start_unix_server') and sys.platform != "win32"
+        self.path = path or (default_socket_path() if self.use_unix else None)
+        self.host = host
+        self.port = port
+        self.endpoint_file = endpoint_file
+        # TCP is reachable by every local user, so it needs a token
+        self.token = None if self.use_unix else secrets.token_hex(16)
+        # name -> (method, signature); signatures are checked before calling
+        self.methods = {}
+        for name in dir(api):
+            func = getattr(api, name)
+            if not name.startswith('_') and callable(func):
+                self.methods[name] = (func, inspect.signature(func))
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="RpcServer", daemon=True)
+            self._thread.start()
+            self._ready.wait(5)
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self.use_unix and self.path and os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        if self.endpoint_file and os.path.exists(self.endpoint_file):
+            try:
+                os.remove(self.endpoint_file)
+            except OSError:
+                pass
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._listen())
+            self._loop.run_until_complete(self._server.serve_forever())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"RPC server error: {e}")
+        finally:
+            # Let open connections finish their cleanup before closing the loop
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._ready.set()
+            self._loop.close()
+
+    async def _listen(self):
+        if self.use_unix:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            old_umask = os.umask(0o077)
+            try:
+                self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=RPC_MAX_LINE)
+            finally:
+                os.umask(old_umask)
+            endpoint = {"transport": "unix", "path": self.path}
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=RPC_MAX_LINE)
+            self.port = self._server.sockets[0].getsockname()[1]
+            endpoint = {"transport": "tcp", "host": self.host, "port": self.port, "token": self.token}
+        self._write_endpoint(endpoint)
+        self._ready.set()
+
+    def _write_endpoint(self, endpoint):
+        if not self.endpoint_file:
+            return
+        try:
+            fd = os.open(self.endpoint_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(endpoint, f, indent=4)
+        except Exception as e:
+            print(f"Error writing RPC endpoint file: {e}")
+
+    async def _handle(self, reader, writer):
+        state = {"authorized": self.token is None}
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Line over RPC_MAX_LINE: the stream can't be resynchronized
+                    writer.write(self._encode(self._error(None, INVALID_REQUEST, "Request too large")))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = self.handle_line(line, state)
+                if response is not None:
+                    writer.write(self._encode(response))
+                    # Only waits when the client isn't reading its responses
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # CancelledError: server shutting down with the connection open
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _encode(response):
+        return (json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8')
+
+    @staticmethod
+    def _error(request_id, code, message):
+        return {"jsonrpc": "2.0", "error": {"code": code, "message": message}, "id": request_id}
+
+    def handle_line(self, line, state):
+        """
+        Returns the response for one request line (None for notifications).
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return self._error(None, PARSE_ERROR, "Parse error")
+        if isinstance(request, list):
+            if not request:
+                return self._error(None, INVALID_REQUEST, "Empty batch")
+            responses = [r for r in (self.handle_request(item, state) for item in request) if r is not None]
+            return responses or None
+        return self.handle_request(request, state)
+
+    def handle_request(self, request, state):
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return self._error(request.get("id") if isinstance(request, dict) else None, INVALID_REQUEST, "Invalid Request")
+        request_id = request.get("id")
+        is_notification = "id" not in request
+        try:
+            result = self.call(request["method"], request.get("params"), state)
+        except RpcError as e:
+            return None if is_notification else self._error(request_id, e.code, e.message)
+        except Exception as e:
+            print(f"RPC method {request['method']} failed: {e}")
+            return None if is_notification else self._error(request_id, INTERNAL_ERROR, str(e))
+        return None if is_notification else {"jsonrpc": "2.0", "result": result, "id": request_id}
+
+    def call(self, method, params, state):
+        if method == "auth":
+            token = params.get("token") if isinstance(params, dict) else (params or [None])[0]
+            if self.token is not None and not secrets.compare_digest(str(token), self.token):
+                raise RpcError(UNAUTHORIZED, "Invalid token")
+            state["authorized"] = True
+            return True
+        if not state["authorized"]:
+            raise RpcError(UNAUTHORIZED, "Call auth with the token from the endpoint file first")
+        if method not in self.methods:
+            raise RpcError(METHOD_NOT_FOUND, f"Method not found: {method}")
+        func, signature = self.methods[method]
+        args, kwargs = [], {}
+        if isinstance(params, list):
+            args = params
+        elif isinstance(params, dict):
+            kwargs = params
+        elif params is not None:
+            raise RpcError(INVALID_PARAMS, "params must be an array or an object")
+        try:
+            signature.bind(*args, **kwargs)
+        except TypeError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+        return func(*args, **kwargs)
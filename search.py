@@ -0,0 +1,617 @@
+import heapq
+import threading
+from array import array
+from collections import OrderedDict
+
+# Joins title and category in the title index; never appears in a query
+FIELD_SEPARATOR = "\x00"
+
+# Relative weight of a hit in each field
+TITLE_WEIGHT = 3.0
+CATEGORY_WEIGHT = 1.5
+CONTENT_WEIGHT = 1.0
+
+# Bonuses for where a substring hit starts
+PREFIX_BONUS = 2.0
+BOUNDARY_BONUS = 1.0
+# Upper bound of substring_score(): base + coverage + position + prefix
+MAX_SUBSTRING_SCORE = 1.0 + 1.0 + 0.5 + PREFIX_BONUS
+
+# Subsequence (fuzzy) matching is only tried on title/category and only for
+# queries this long; shorter ones match almost everything.
+FUZZY_MIN_QUERY = 3
+# Fuzzy fill-up looks at no more than this many candidates per query
+FUZZY_SCAN_LIMIT = 5000
+
+# Number of recent queries whose hits are kept for narrowing/backspace
+QUERY_CACHE_SIZE = 32
+
+# A running search polls its `cancelled` callback once per this many templates
+CANCEL_CHECK_INTERVAL = 256
+
+class NgramIndex:
+    """
+    Character n-gram inverted index for substring search.
+    Works on raw characters, so Japanese text without word boundaries is fine.
+    Unigrams are indexed too so one-character queries still narrow the set.
+    candidates() may contain false positives; callers verify with `in`.
+
+    Postings are compact int arrays of internal doc numbers. Removing a doc
+    only tombstones its number; postings are compacted once tombstones
+    outnumber live docs.
+    """
+    def __init__(self, n=2):
+        self.n = n
+        self._postings = {}
+        self._doc_num = {}
+        self._num_doc = []
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._doc_num)
+
+    def _grams(self, text):
+        grams = set(text)
+        if self.n == 2:
+            # Pairwise concatenation runs in C; much faster than slicing
+            grams.update(map(str.__add__, text, text[1:]))
+        elif self.n > 2:
+            grams.update(map("".join, zip(*(text[i:] for i in range(self.n)))))
+        return grams
+
+    def add(self, doc_id, text):
+        if doc_id in self._doc_num:
+            self.remove(doc_id)
+        num = len(self._num_doc)
+        self._num_doc.append(doc_id)
+        self._doc_num[doc_id] = num
+        postings = self._postings
+        for g in self._grams(text):
+            ids = postings.get(g)
+            if ids is None:
+                postings[g] = array('i', (num,))
+            else:
+                ids.append(num)
+
+    def remove(self, doc_id):
+        num = self._doc_num.pop(doc_id, None)
+        if num is None:
+            return
+        self._num_doc[num] = None
+        self._dead += 1
+        if self._dead > max(1024, len(self._doc_num)):
+            self.compact()
+
+    def compact(self):
+        """
+        Drops tombstoned doc numbers and renumbers live docs densely.
+        """
+        remap = array('i', [-1]) * len(self._num_doc)
+        num_doc = []
+        for old, doc_id in enumerate(self._num_doc):
+            if doc_id is not None:
+                remap[old] = len(num_doc)
+                num_doc.append(doc_id)
+        postings = {}
+        for g, ids in self._postings.items():
+            live = array('i', [remap[i] for i in ids if remap[i] >= 0])
+            if live:
+                postings[g] = live
+        self._postings = postings
+        self._num_doc = num_doc
+        self._doc_num = {doc_id: num for num, doc_id in enumerate(num_doc)}
+        self._dead = 0
+
+    def _lookup(self, grams):
+        postings = []
+        for g in grams:
+            ids = self._postings.get(g)
+            if not ids:
+                return set()
+            postings.append(ids)
+        # Intersect starting from the rarest gram
+        postings.sort(key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            result.intersection_update(ids)
+            if not result:
+                break
+        num_doc = self._num_doc
+        result = {num_doc[num] for num in result}
+        result.discard(None)
+        return result
+
+    def candidates(self, query):
+        """
+        Returns the set of doc ids that contain every n-gram of query.
+        """
+        if not query:
+            return set(self._doc_num)
+        if len(query) < self.n:
+            return self._lookup(set(query))
+        # Unigrams are implied by the longer grams
+        n = self.n
+        return self._lookup({query[i:i + n] for i in range(len(query) - n + 1)})
+
+    def char_candidates(self, chars):
+        """
+        Returns the set of doc ids containing every one of chars (any order).
+        """
+        if not chars:
+            return set(self._doc_num)
+        return self._lookup(set(chars))
+
+
+def is_boundary(text, pos):
+    return pos == 0 or not text[pos - 1].isalnum()
+
+def substring_score(text, query):
+    """
+    Scores a contiguous hit of query in text, or returns None.
+    Earlier hits, prefix/word-boundary hits and shorter texts score higher.
+    """
+    pos = text.find(query)
+    if pos < 0:
+        return None
+    score = 1.0 + len(query) / (len(text) + 1) + 0.5 / (1 + pos)
+    if pos == 0:
+        score += PREFIX_BONUS
+    elif is_boundary(text, pos):
+        score += BOUNDARY_BONUS
+    return score
+
+def fuzzy_score(text, query):
+    """
+    Scores query as a subsequence of text, or returns None.
+    Always below 1.0 so any substring hit outranks a fuzzy one.
+    """
+    pos = 0
+    prev = -2
+    consecutive = 0
+    boundaries = 0
+    for ch in query:
+        pos = text.find(ch, pos)
+        if pos < 0:
+            return None
+        if pos == prev + 1:
+            consecutive += 1
+        if is_boundary(text, pos):
+            boundaries += 1
+        prev = pos
+        pos += 1
+    span = prev - text.find(query[0]) + 1
+    return 0.2 + 0.4 * (consecutive / len(query)) + 0.2 * (len(query) / span) + 0.1 * min(boundaries, 2)
+
+
+class SearchCancelled(Exception):
+    """
+    Raised inside TemplateSearch.search() when a newer query superseded it.
+    """
+
+
+def checked(items, cancelled):
+    """
+    Iterates items, raising SearchCancelled as soon as cancelled() returns
+    True (polled every CANCEL_CHECK_INTERVAL items), so a superseded search
+    never holds the index lock for long.
+    """
+    if cancelled is None:
+        yield from items
+        return
+    for pos, item in enumerate(items):
+        if pos % CANCEL_CHECK_INTERVAL == 0 and cancelled():
+            raise SearchCancelled()
+        yield item
+
+def scan(items, query, limit=None, content_loader=None, cancelled=None):
+    """
+    Unindexed search, used while the index is still being built: items
+    whose title/category contain query (already lowercased), then those
+    whose content does, each in list order.
+    """
+    title_hits = []
+    content_hits = []
+    for item in checked(items, cancelled):
+        if query in item.get('title', '').lower() or query in item.get('category', '').lower():
+            title_hits.append(item)
+            if limit is not None and len(title_hits) >= limit:
+                break
+        elif limit is None or len(content_hits) < limit:
+            content = item.get('content')
+            if content is None and content_loader is not None:
+                content = content_loader(item)
+            if query in (content or "").lower():
+                content_hits.append(item)
+    results = title_hits + content_hits
+    return results if limit is None else results[:limit]
+
+
+class CachedQuery:
+    """
+    Verified hits for one query. Sets are filled lazily (content hits are
+    skipped when title hits already fill the top k); `ranked` keeps the
+    final ids per requested limit.
+    """
+    __slots__ = ("title_ids", "content_ids", "ranked")
+
+    def __init__(self):
+        self.title_ids = None
+        self.content_ids = None
+        self.ranked = {}
+
+
+class QueryCache:
+    """
+    LRU cache of CachedQuery entries. Every template matching "meet" also
+    matches "mee", so a longer query only re-checks the cached hits of the
+    longest cached query it contains. Cleared whenever the index changes.
+    """
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query):
+        entry = self._entries.get(query)
+        if entry is not None:
+            self._entries.move_to_end(query)
+        return entry
+
+    def put(self, query, entry):
+        self._entries[query] = entry
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def nearest(self, query):
+        """
+        Returns the entry of the longest other cached query contained in query.
+        """
+        best_key = None
+        for key in self._entries:
+            if key != query and key in query and (best_key is None or len(key) > len(best_key)):
+                best_key = key
+        return self._entries[best_key] if best_key is not None else None
+
+    def clear(self):
+        self._entries.clear()
+
+
+class TemplateSearch:
+    """
+    Ranked search over templates.
+    Title/category and content are indexed separately. Title/category hits
+    are scored first; content is only scanned while its best possible score
+    could still enter the top `limit`. Subsequence (fuzzy) matching on
+    title/category only fills up when substring hits are short of `limit`.
+    The best `limit` results are picked with a heap. sync() only re-indexes
+    templates that changed.
+
+    With a `content_loader` (lazy storage), bodies are read once to index
+    them and again only to verify/score candidates; they aren't kept here.
+    """
+    def __init__(self, n=2, content_loader=None):
+        self.content_loader = content_loader
+        self.title_index = NgramIndex(n)
+        self.content_index = NgramIndex(n)
+        self._items = {}
+        self._fields_lower = {}
+        self._order = {}
+        self.cache = QueryCache()
+        # Searches may run on a worker thread while the GUI thread syncs
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _signature(item):
+        # Lazy items have no content; their timestamp/blob change instead
+        return (item.get('title', ''), item.get('content'), item.get('category', ''),
+                item.get('timestamp'), item.get('blob'))
+
+    def _load_content(self, item):
+        content = item.get('content')
+        if content is None and self.content_loader is not None:
+            content = self.content_loader(item)
+        return content or ""
+
+    def _content_lower(self, item_id):
+        content = self._fields_lower[item_id][1]
+        if content is None:
+            content = self._load_content(self._items[item_id]).lower()
+        return content
+
+    def add(self, item):
+        item_id = item.get('id')
+        if item_id is None:
+            return
+        title = item.get('title', '').lower()
+        category = item.get('category', '').lower()
+        content = self._load_content(item).lower()
+        with self.lock:
+            self._items[item_id] = item
+            kept = None if self.content_loader is not None else content
+            self._fields_lower[item_id] = (title, kept, category)
+            self.title_index.add(item_id, title + FIELD_SEPARATOR + category)
+            self.content_index.add(item_id, content)
+            self._order.setdefault(item_id, len(self._order))
+            self.cache.clear()
+
+    update = add
+
+    def remove(self, item_id):
+        with self.lock:
+            self._items.pop(item_id, None)
+            self._fields_lower.pop(item_id, None)
+            self._order.pop(item_id, None)
+            self.title_index.remove(item_id)
+            self.content_index.remove(item_id)
+            self.cache.clear()
+
+    def sync(self, items):
+        """
+        Brings the index in line with items (in display order).
+        Returns (added, changed, removed) counts.
+        """
+        with self.lock:
+            return self._sync(items)
+
+    def _sync(self, items):
+        added = changed = 0
+        seen = set()
+        for item in items:
+            item_id = item.get('id')
+            if item_id is None:
+                continue
+            seen.add(item_id)
+            old = self._items.get(item_id)
+            if old is None:
+                self.add(item)
+                added += 1
+            elif old is not item and self._signature(old) != self._signature(item):
+                self.add(item)
+                changed += 1
+            else:
+                self._items[item_id] = item
+        stale = [item_id for item_id in self._items if item_id not in seen]
+        for item_id in stale:
+            self.remove(item_id)
+        order = {item.get('id'): pos for pos, item in enumerate(items)}
+        # Cached rankings break ties by the old order
+        if added or changed or stale or order != self._order:
+            self.cache.clear()
+        self._order = order
+        return added, changed, len(stale)
+
+    def _title_hits(self, query, entry, parent, scored, cancelled=None):
+        """
+        Scores the ids whose title/category contain query into `scored`.
+        Candidates are narrowed from the cached result of a shorter query
+        contained in this one when available; scoring doubles as verifying
+        them, and the hits are cached in entry.title_ids.
+        """
+        if entry.title_ids is not None:
+            self._score_titles(entry.title_ids, query, scored, cancelled)
+            return
+        if parent is not None and parent.title_ids is not None:
+            base = parent.title_ids
+        else:
+            base = self.title_index.candidates(query)
+        self._score_titles(base, query, scored, cancelled)
+        entry.title_ids = set(scored)
+
+    def _content_hits(self, query, entry, parent, cancelled=None):
+        if entry.content_ids is None:
+            if parent is not None and parent.content_ids is not None:
+                base = parent.content_ids
+            else:
+                base = self.content_index.candidates(query)
+            fields = self._fields_lower
+            entry.content_ids = {
+                item_id for item_id in checked(base, cancelled)
+                if item_id in fields and query in self._content_lower(item_id)
+            }
+        return entry.content_ids
+
+    def _score_title(self, item_id, query, fuzzy):
+        title, _, category = self._fields_lower[item_id]
+        best = None
+        for text, weight in ((title, TITLE_WEIGHT), (category, CATEGORY_WEIGHT)):
+            s = substring_score(text, query)
+            if s is None and fuzzy:
+                s = fuzzy_score(text, query)
+            if s is not None and (best is None or s * weight > best):
+                best = s * weight
+        return best
+
+    def _score_titles(self, item_ids, query, scored, cancelled=None):
+        """
+        substring_score() over title and category of many ids at once,
+        written out inline: this loop runs for every title hit, so per-item
+        function calls dominate its cost.
+        """
+        fields = self._fields_lower
+        find = str.find
+        qlen = len(query)
+        for item_id in checked(item_ids, cancelled):
+            entry = fields.get(item_id)
+            if entry is None:
+                continue
+            title, _, category = entry
+            best = 0.0
+            pos = find(title, query)
+            if pos >= 0:
+                s = 1.0 + qlen / (len(title) + 1) + 0.5 / (1 + pos)
+                if pos == 0:
+                    s += PREFIX_BONUS
+                elif not title[pos - 1].isalnum():
+                    s += BOUNDARY_BONUS
+                best = s * TITLE_WEIGHT
+            pos = find(category, query)
+            if pos >= 0:
+                s = 1.0 + qlen / (len(category) + 1) + 0.5 / (1 + pos)
+                if pos == 0:
+                    s += PREFIX_BONUS
+                elif not category[pos - 1].isalnum():
+                    s += BOUNDARY_BONUS
+                if s * CATEGORY_WEIGHT > best:
+                    best = s * CATEGORY_WEIGHT
+            if best:
+                scored[item_id] = best
+
+    def _score_content(self, item_id, query):
+        s = substring_score(self._content_lower(item_id), query)
+        return None if s is None else s * CONTENT_WEIGHT
+
+    def score(self, item_id, query, fuzzy=True):
+        """
+        Returns the weighted score of one template, or None if it doesn't match.
+        """
+        best = self._score_title(item_id, query, fuzzy)
+        content = self._score_content(item_id, query)
+        if content is not None and (best is None or content > best):
+            best = content
+        return best
+
+    def search(self, query, limit=None, candidates=None, cancelled=None):
+        """
+        Returns up to `limit` items matching query (already lowercased),
+        best first. Ties keep display order. `candidates` restricts the
+        search to the given ids (e.g. from a storage backend).
+        `cancelled` is polled throughout (see checked()); when it returns
+        True the search stops with SearchCancelled.
+        """
+        with self.lock:
+            return self._search(query, limit, candidates, cancelled)
+
+    def _search(self, query, limit, candidates, cancelled):
+        if limit is not None and limit <= 0:
+            return []
+        order = self._order
+        if not query:
+            items = list(self._items.values())
+            items.sort(key=lambda item: order.get(item.get('id'), len(order)))
+            return items if limit is None else items[:limit]
+
+        fuzzy = len(query) >= FUZZY_MIN_QUERY
+        rank = len(order)
+        scored = {}
+
+        if candidates is not None:
+            for item_id in checked(candidates, cancelled):
+                if item_id in self._fields_lower:
+                    s = self.score(item_id, query, fuzzy)
+                    if s is not None:
+                        scored[item_id] = s
+        else:
+            entry = self.cache.get(query)
+            if entry is not None and limit in entry.ranked:
+                # Exact repeat (e.g. after backspace): reuse the ranked result
+                return [self._items[item_id] for item_id in entry.ranked[limit]]
+            if entry is None:
+                entry = self.cache.put(query, CachedQuery())
+            parent = self.cache.nearest(query)
+
+            self._title_hits(query, entry, parent, scored, cancelled)
+
+            # A content-only hit can't beat the current k-th best once that
+            # is above the best possible content score
+            need_content = limit is None or len(scored) < limit or \
+                heapq.nlargest(limit, scored.values())[-1] < CONTENT_WEIGHT * MAX_SUBSTRING_SCORE
+            if need_content:
+                for item_id in checked(self._content_hits(query, entry, parent, cancelled), cancelled):
+                    s = self._score_content(item_id, query)
+                    if s > scored.get(item_id, 0):
+                        scored[item_id] = s
+
+            if fuzzy and (limit is None or len(scored) < limit):
+                budget = FUZZY_SCAN_LIMIT
+                for item_id in checked(self.title_index.char_candidates(query), cancelled):
+                    if item_id in scored:
+                        continue
+                    s = self._score_title(item_id, query, True)
+                    if s is not None:
+                        scored[item_id] = s
+                    budget -= 1
+                    if not budget:
+                        break
+
+        if limit is not None and limit < len(scored):
+            # Only ids scoring at least the k-th best can make the top k;
+            # build the tie-breaking tuples for those alone
+            kth = heapq.nlargest(limit, scored.values())[-1]
+            ranked = [(s, -order.get(item_id, rank), item_id) for item_id, s in scored.items() if s >= kth]
+            ranked = heapq.nlargest(limit, ranked)
+        else:
+            ranked = sorted(((s, -order.get(item_id, rank), item_id) for item_id, s in scored.items()), reverse=True)
+        ranked_ids = [item_id for _, _, item_id in ranked]
+        if candidates is None:
+            entry.ranked[limit] = ranked_ids
+        return [self._items[item_id] for item_id in ranked_ids]
+
+
+class SearchWorker:
+    """
+    Runs searches on a background thread. Only the newest submitted query is
+    kept; a running search is cancelled as soon as a newer one arrives.
+    on_result(token, query, results) is called from the worker thread.
+    """
+    def __init__(self, search_fn, on_result):
+        self.search_fn = search_fn
+        self.on_result = on_result
+        self._cond = threading.Condition()
+        self._pending = None
+        self._latest = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="SearchWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, query):
+        """
+        Queues query, replacing any not-yet-started one. Returns its token.
+        """
+        with self._cond:
+            self._latest += 1
+            self._pending = (self._latest, query)
+            self._cond.notify()
+            return self._latest
+
+    def is_stale(self, token):
+        return token != self._latest
+
+    def cancel(self):
+        """
+        Drops the queued query and makes the running one stale, so it stops
+        at its next check and releases the index.
+        """
+        with self._cond:
+            self._latest += 1
+            self._pending = None
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                token, query = self._pending
+                self._pending = None
+            try:
+                results = self.search_fn(query, lambda: self.is_stale(token))
+            except SearchCancelled:
+                continue
+            except Exception as e:
+                print(f"Search error: {e}")
+                continue
+            if not self.is_stale(token):
+                self.on_result(token, query, results)
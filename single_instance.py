@@ -0,0 +1,122 @@
+"""
+Single-instance guard and command channel. The first instance owns a
+per-user local IPC endpoint (a named pipe on Windows, a Unix domain socket
+guarded by a lock file elsewhere); later launches forward their command
+to it and exit without starting Tk.
+
+Messages are JSON objects, e.g. {"command": "show_paste"},
+{"command": "save", "text": "..."}, {"command": "paste", "id": "..."};
+the reply is {"ok": true} or {"error": "..."}.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+
+APP_ID = "ClipboardManager"
+# A starting first instance may not be listening yet; keep trying this long
+CONNECT_TIMEOUT = 2.0
+
+# Set to run a separate instance (e.g. build.py's startup benchmark) that
+# neither forwards to nor blocks the one the user is running
+INSTANCE_ENV = "CLIPBOARD_MANAGER_INSTANCE"
+
+def default_address():
+    instance = os.environ.get(INSTANCE_ENV)
+    suffix = f"-{instance}" if instance else ""
+    if sys.platform == "win32":
+        user = os.environ.get("USERNAME", "user")
+        return rf"\\.\pipe\{APP_ID}-{user}{suffix}"
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(base, f"{APP_ID}-{os.getuid()}{suffix}.sock")
+
+class SingleInstance:
+    def __init__(self, address=None):
+        self.address = address or default_address()
+        self.family = "AF_PIPE" if sys.platform == "win32" else "AF_UNIX"
+        self._lock_file = None
+        self._listener = None
+        self._thread = None
+
+    def acquire(self):
+        """
+        Becomes the primary instance and starts listening. Returns False if
+        another instance already is.
+        """
+        if self.family == "AF_PIPE":
+            # The first pipe instance is exclusive; creating it again fails
+            try:
+                self._listener = Listener(self.address, family=self.family)
+            except OSError:
+                return False
+            return True
+
+        import fcntl
+        lock_file = open(f"{self.address}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        # The lock is ours, so a leftover socket is from a crashed instance
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        old_umask = os.umask(0o077) # Socket usable by this user only
+        try:
+            self._listener = Listener(self.address, family=self.family)
+        finally:
+            os.umask(old_umask)
+        return True
+
+    def serve(self, handler):
+        """
+        Answers forwarded commands on a background thread. handler(message)
+        runs on that thread and returns the reply dict.
+        """
+        if self._listener is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._serve, args=(handler,), name="SingleInstance", daemon=True)
+        self._thread.start()
+
+    def _serve(self, handler):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return # Listener closed
+            try:
+                with conn:
+                    message = json.loads(conn.recv_bytes(1024 * 1024))
+                    reply = handler(message) or {"ok": True}
+                    conn.send_bytes(json.dumps(reply).encode('utf-8'))
+            except Exception as e:
+                print(f"Error handling forwarded command: {e}")
+
+    def send(self, message, timeout=CONNECT_TIMEOUT):
+        """
+        Forwards message to the primary instance and returns its reply.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                conn = Client(self.address, family=self.family)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+        with conn:
+            conn.send_bytes(json.dumps(message).encode('utf-8'))
+            return json.loads(conn.recv_bytes())
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
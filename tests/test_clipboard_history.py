@@ -0,0 +1,106 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_manager import ClipboardHistory, ClipboardMonitor, HISTORY_ID_PREFIX, is_history_item
+
+
+def contents(history):
+    return [entry['content'] for entry in history.entries()]
+
+
+class ClipboardHistoryTest(unittest.TestCase):
+    def test_oldest_entries_are_evicted_by_count(self):
+        history = ClipboardHistory(max_items=3)
+        for text in ("one", "two", "three", "four"):
+            history.add(text)
+        self.assertEqual(contents(history), ["four", "three", "two"])
+
+    def test_oldest_entries_are_evicted_by_size(self):
+        history = ClipboardHistory(max_bytes=10)
+        history.add("aaaa")
+        history.add("bbbb")
+        history.add("ccc")
+        self.assertEqual(contents(history), ["ccc", "bbbb"])
+        self.assertEqual(history.total_bytes, 7)
+        # UTF-8 bytes, not characters
+        history.add("ああ")
+        self.assertEqual(contents(history), ["ああ", "ccc"])
+        self.assertEqual(history.total_bytes, 9)
+
+    def test_text_larger_than_limit_is_not_recorded(self):
+        history = ClipboardHistory(max_bytes=4)
+        self.assertFalse(history.add("12345"))
+        self.assertFalse(history.add("   "))
+        self.assertFalse(history.add(""))
+        self.assertEqual(len(history), 0)
+
+    def test_copying_again_moves_to_front(self):
+        history = ClipboardHistory()
+        history.add("one")
+        history.add("two")
+        size = history.total_bytes
+        self.assertTrue(history.add("one"))
+        self.assertEqual(contents(history), ["one", "two"])
+        self.assertEqual(history.total_bytes, size)
+
+    def test_entries_look_like_templates(self):
+        history = ClipboardHistory()
+        history.add("first line that is quite a bit longer than forty characters\nsecond")
+        entry = history.entries()[0]
+        self.assertTrue(is_history_item(entry))
+        self.assertTrue(entry['id'].startswith(HISTORY_ID_PREFIX))
+        self.assertEqual(entry['title'], "first line that is quite a bit longer th...")
+
+    def test_remove_and_search(self):
+        history = ClipboardHistory()
+        for text in ("Meeting notes", "invoice", "meeting room"):
+            history.add(text)
+        self.assertEqual([e['content'] for e in history.search("meeting")], ["meeting room", "Meeting notes"])
+        self.assertEqual(len(history.search("meeting", limit=1)), 1)
+        entry = history.search("invoice")[0]
+        self.assertTrue(history.remove(entry['id']))
+        self.assertFalse(history.remove(entry['id']))
+        self.assertEqual(history.total_bytes, len("Meeting notes") + len("meeting room"))
+
+
+class FakeClipboard:
+    def __init__(self):
+        self.text = ""
+        self.last_set_text = None
+
+    def get_clipboard_text(self):
+        return self.text
+
+
+class ClipboardMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.clipboard = FakeClipboard()
+        self.history = ClipboardHistory()
+        self.changes = []
+        self.monitor = ClipboardMonitor(self.clipboard, self.history, on_change=lambda: self.changes.append(1))
+
+    def test_own_pastes_are_not_recorded(self):
+        self.clipboard.text = self.clipboard.last_set_text = "template"
+        self.monitor.check()
+        self.clipboard.text = "copied"
+        self.monitor.check()
+        self.assertEqual(contents(self.history), ["copied"])
+        self.assertEqual(len(self.changes), 1)
+
+    def test_polling_backs_off_while_unchanged(self):
+        self.monitor.method = "polling"
+        self.clipboard.text = "copied"
+        self.monitor.check()
+        self.monitor.check()
+        self.assertGreater(self.monitor._delay, self.monitor.interval)
+        self.clipboard.text = "again"
+        self.monitor.check()
+        self.assertEqual(self.monitor._delay, self.monitor.interval)
+        self.assertEqual(contents(self.history), ["again", "copied"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_handler import DataHandler
+from search import TemplateSearch
+from rpc_server import (RpcServer, TemplateApi, PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND,
+                        INVALID_PARAMS, UNAUTHORIZED)
+
+
+class HandleLineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.handler = DataHandler(os.path.join(self.tmp.name, "templates.json"), write_delay=0)
+        self.item = self.handler.add_template("会議の案内", "本文", "Work")
+        self.deleted = []
+        self.pasted = []
+
+        def search(query, limit):
+            index = TemplateSearch()
+            index.sync(self.handler.load_data())
+            return index.search(query, limit=limit)
+
+        def delete(item_id):
+            self.deleted.append(item_id)
+            self.handler.delete_template(item_id)
+
+        api = TemplateApi(self.handler, search, paste=self.pasted.append, delete=delete)
+        self.server = RpcServer(api, path=os.path.join(self.tmp.name, "rpc.sock"), endpoint_file=None)
+        self.state = {"authorized": True}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def call(self, request, state=None):
+        line = request if isinstance(request, str) else json.dumps(request)
+        return self.server.handle_line(line, self.state if state is None else state)
+
+    def request(self, method, params=None, request_id=1):
+        request = {"jsonrpc": "2.0", "method": method, "id": request_id}
+        if params is not None:
+            request["params"] = params
+        return request
+
+    def error_code(self, response):
+        return response["error"]["code"]
+
+    def test_search_and_get(self):
+        response = self.call(self.request("search", {"query": "会議"}))
+        self.assertEqual([r["id"] for r in response["result"]], [self.item["id"]])
+        self.assertNotIn("content", response["result"][0])
+        response = self.call(self.request("get", [self.item["id"]]))
+        self.assertEqual(response["result"]["content"], "本文")
+        self.assertIsNone(self.call(self.request("get", ["missing"]))["result"])
+
+    def test_add_update_delete_paste(self):
+        added = self.call(self.request("add", {"title": "挨拶", "content": "こんにちは"}))["result"]
+        self.assertTrue(self.call(self.request("update", {"id": added["id"], "content": "改"}))["result"])
+        self.assertEqual(self.handler.get_content(added["id"]), "改")
+        self.assertTrue(self.call(self.request("paste", [added["id"]]))["result"])
+        self.assertEqual(self.pasted, [added["id"]])
+        self.assertTrue(self.call(self.request("delete", [added["id"]]))["result"])
+        self.assertEqual(self.deleted, [added["id"]])
+        self.assertFalse(self.call(self.request("delete", [added["id"]]))["result"])
+
+    def test_batch_skips_notifications(self):
+        response = self.call([
+            self.request("search", {"query": "会議"}, request_id="a"),
+            {"jsonrpc": "2.0", "method": "search", "params": {"query": "x"}},
+            self.request("nope", request_id="b"),
+        ])
+        self.assertEqual([r["id"] for r in response], ["a", "b"])
+        self.assertEqual(self.error_code(response[1]), METHOD_NOT_FOUND)
+        # Only notifications: nothing to send back
+        self.assertIsNone(self.call([{"jsonrpc": "2.0", "method": "search"}]))
+        self.assertEqual(self.error_code(self.call([])), INVALID_REQUEST)
+
+    def test_malformed_requests(self):
+        self.assertEqual(self.error_code(self.call("{not json")), PARSE_ERROR)
+        self.assertEqual(self.error_code(self.call({"method": "search", "id": 1})), INVALID_REQUEST)
+        self.assertEqual(self.error_code(self.call([1])[0]), INVALID_REQUEST)
+        self.assertEqual(self.error_code(self.call(self.request("search", "query"))), INVALID_PARAMS)
+
+    def test_invalid_params(self):
+        for request in (
+            self.request("search", {"query": 5}),
+            self.request("search", {"limit": 0}),
+            self.request("search", {"limit": True}),
+            self.request("search", {"unknown": 1}),
+            self.request("add", {"title": "only title"}),
+            self.request("add", {"title": "t", "content": ["x"]}),
+            self.request("update", {"id": self.item["id"], "title": 1}),
+        ):
+            self.assertEqual(self.error_code(self.call(request)), INVALID_PARAMS, request)
+
+    def test_non_string_ids_are_rejected(self):
+        for method in ("get", "update", "delete", "paste"):
+            response = self.call(self.request(method, [[1]]))
+            self.assertEqual(self.error_code(response), INVALID_PARAMS, method)
+        self.assertEqual(self.deleted, [])
+
+    def test_token_required_over_tcp(self):
+        self.server.token = "secret"
+        state = {"authorized": False}
+        self.assertEqual(self.error_code(self.call(self.request("search"), state)), UNAUTHORIZED)
+        self.assertEqual(self.error_code(self.call(self.request("auth", ["wrong"]), state)), UNAUTHORIZED)
+        self.assertTrue(self.call(self.request("auth", {"token": "secret"}), state)["result"])
+        self.assertIn("result", self.call(self.request("search"), state))
+
+
+if __name__ == "__main__":
+    unittest.main()
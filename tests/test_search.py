@@ -0,0 +1,177 @@
+import os
+import random
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import NgramIndex, QueryCache, CachedQuery, TemplateSearch, SearchWorker, SearchCancelled
+
+WORDS = ["meeting", "memo", "invoice", "請求書", "会議", "議事録", "report", "mail", "お礼", "schedule"]
+
+
+def make_items(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"id{i}",
+            "title": " ".join(rng.sample(WORDS, 2)),
+            "content": " ".join(rng.choice(WORDS) for _ in range(5)),
+            "category": rng.choice(["General", "Work", "仕事"]),
+        }
+        for i in range(count)
+    ]
+
+
+def ids(items):
+    return [item['id'] for item in items]
+
+
+class NgramIndexTest(unittest.TestCase):
+    def test_removed_docs_are_not_candidates(self):
+        index = NgramIndex()
+        index.add("a", "meeting")
+        index.add("b", "memo")
+        index.remove("a")
+        self.assertEqual(index.candidates("me"), {"b"})
+        self.assertEqual(index.candidates(""), {"b"})
+        self.assertEqual(len(index), 1)
+        # Removing twice is harmless; re-adding brings it back
+        index.remove("a")
+        index.add("a", "meeting")
+        self.assertEqual(index.candidates("me"), {"a", "b"})
+
+    def test_readding_replaces_old_text(self):
+        index = NgramIndex()
+        index.add("a", "meeting")
+        index.add("a", "invoice")
+        self.assertEqual(index.candidates("meet"), set())
+        self.assertEqual(index.candidates("voi"), {"a"})
+
+    def test_compaction_keeps_live_docs(self):
+        index = NgramIndex()
+        for i in range(3000):
+            index.add(i, "kept" if i % 4 == 0 else "gone")
+        for i in range(3000):
+            if i % 4:
+                index.remove(i)
+        # Tombstones outnumbered the live docs at some point: compacted
+        self.assertLess(len(index._num_doc), 3000)
+        self.assertEqual(index.candidates("kept"), set(range(0, 3000, 4)))
+        self.assertEqual(index.candidates("gone"), set())
+
+        index.compact()
+        self.assertEqual(index._dead, 0)
+        self.assertEqual(len(index._num_doc), 750)
+        self.assertEqual(index.candidates("ke"), set(range(0, 3000, 4)))
+        index.add(1, "gone")
+        self.assertEqual(index.candidates("go"), {1})
+
+
+class QueryCacheTest(unittest.TestCase):
+    def test_nearest_is_longest_contained_query(self):
+        cache = QueryCache()
+        for query in ("m", "me", "ee", "xyz"):
+            cache.put(query, CachedQuery())
+        self.assertIs(cache.nearest("meet"), cache.get("me"))
+        self.assertIsNone(cache.nearest("abc"))
+        # Never the entry of the query itself
+        self.assertIs(cache.nearest("me"), cache.get("m"))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = QueryCache(maxsize=2)
+        cache.put("a", CachedQuery())
+        cache.put("b", CachedQuery())
+        cache.get("a")
+        cache.put("c", CachedQuery())
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(len(cache), 2)
+
+
+class TemplateSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.items = make_items(2000)
+        self.index = TemplateSearch()
+        self.index.sync(self.items)
+        self.reference = TemplateSearch()
+        self.reference.sync(self.items)
+
+    def fresh(self, query, limit=None):
+        # The same search with nothing cached
+        self.reference.cache.clear()
+        return ids(self.reference.search(query, limit=limit))
+
+    def test_typing_and_backspace_match_uncached_search(self):
+        typed = ["m", "me", "mee", "meet", "meeti", "meet", "mee", "me", "会", "会議", "会", "invce", "inv"]
+        for limit in (20, None):
+            for query in typed:
+                self.assertEqual(ids(self.index.search(query, limit=limit)), self.fresh(query, limit), (query, limit))
+
+    def test_cache_is_dropped_when_templates_change(self):
+        pos, item = next((pos, item) for pos, item in enumerate(self.items)
+                         if "memo" not in item['title'] + item['content'])
+        self.assertNotIn(item['id'], ids(self.index.search("memo")))
+        items = list(self.items)
+        items[pos] = dict(item, title="memo")
+        self.index.sync(items)
+        self.assertEqual(ids(self.index.search("memo"))[0], item['id'])
+
+    def test_limit_returns_top_of_full_ranking(self):
+        for query in ("m", "me", "report", "請求", "mtng", "zzz"):
+            full = self.fresh(query)
+            for limit in (1, 5, 50, len(full) + 1):
+                self.assertEqual(self.fresh(query, limit), full[:limit], (query, limit))
+
+    def test_ties_keep_display_order(self):
+        items = [{"id": str(i), "title": "same", "content": "", "category": "General"} for i in range(50)]
+        index = TemplateSearch()
+        index.sync(items[::-1])
+        self.assertEqual(ids(index.search("same", limit=10)), [str(i) for i in range(49, 39, -1)])
+
+    def test_cancelled_search_stops_and_leaves_cache_usable(self):
+        with self.assertRaises(SearchCancelled):
+            self.index.search("me", limit=20, cancelled=lambda: True)
+        # Cancelled partway through scoring
+        calls = []
+        def cancel_later():
+            calls.append(1)
+            return len(calls) > 1
+        with self.assertRaises(SearchCancelled):
+            self.index.search("m", limit=20, cancelled=cancel_later)
+        self.assertEqual(ids(self.index.search("m", limit=20)), self.fresh("m", 20))
+        self.assertEqual(ids(self.index.search("me", limit=20)), self.fresh("me", 20))
+
+
+class SearchWorkerTest(unittest.TestCase):
+    def test_newer_query_cancels_running_one(self):
+        started = threading.Event()
+        done = threading.Event()
+        results = []
+
+        def search_fn(query, cancelled):
+            if query == "slow":
+                started.set()
+                for _ in range(200):
+                    if cancelled():
+                        raise SearchCancelled()
+                    time.sleep(0.01)
+            return [query]
+
+        def on_result(token, query, found):
+            results.append(found)
+            done.set()
+
+        worker = SearchWorker(search_fn, on_result)
+        worker.submit("slow")
+        self.assertTrue(started.wait(2))
+        worker.submit("fast")
+        self.assertTrue(done.wait(2))
+        worker.stop()
+        self.assertEqual(results, [["fast"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_handler import DataHandler
+from search import TemplateSearch
+
+
+class TornReadTest(unittest.TestCase):
+    """
+    A file caught halfway through an external write must not read as
+    "every template was deleted".
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, "templates.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check(self, storage, torn_file):
+        handler = DataHandler(self.data_file, storage=storage, write_delay=0)
+        for i in range(5):
+            handler.add_template(f"t{i}", "body")
+        with open(torn_file, 'r+', encoding='utf-8') as f:
+            f.truncate(10)
+
+        self.assertIsNone(handler.reload_changes())
+        self.assertEqual(len(handler.load_data()), 5)
+        handler.add_template("after", "body")
+
+        reopened = DataHandler(self.data_file, storage=storage)
+        self.assertEqual(len(reopened.load_data()), 6)
+
+    def test_json(self):
+        self.check("json", self.data_file)
+
+    def test_split(self):
+        self.check("split", os.path.join(self.tmp.name, "templates.index.json"))
+
+
+class JournalCrashTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, "templates.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_handler(self):
+        return DataHandler(self.data_file, storage="journal", write_delay=0)
+
+    def titles(self):
+        return sorted(item['title'] for item in self.open_handler().load_data())
+
+    def test_append_after_torn_record_survives(self):
+        self.open_handler().add_template("first", "1")
+        # Crash mid-append: last record cut off without its newline
+        with open(self.data_file + ".journal", 'a', encoding='utf-8') as f:
+            f.write('{"op": "put", "item": {"id": "torn", "tit')
+
+        handler = self.open_handler()
+        self.assertEqual(sorted(item['title'] for item in handler.load_data()), ["first"])
+        handler.add_template("second", "2")
+
+        self.assertEqual(self.titles(), ["first", "second"])
+
+
+class SplitStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, "templates.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_commit_leaves_caller_items_untouched(self):
+        handler = DataHandler(self.data_file, storage="split", write_delay=0.01)
+        item = handler.add_template("greeting", "hello")
+        snapshot = dict(item)
+        handler.flush()
+
+        # Readers holding the dict never see it change under them
+        self.assertEqual(item, snapshot)
+        # The handler's own copy drops the body once it is on disk
+        stored = handler.get_template(item['id'])
+        self.assertIsNot(stored, item)
+        self.assertNotIn('content', stored)
+        self.assertEqual(handler.read_content(stored), "hello")
+
+        reopened = DataHandler(self.data_file, storage="split")
+        self.assertEqual(reopened.get_content(item['id']), "hello")
+        self.assertEqual(reopened.get_template(item['id']), stored)
+
+
+class SqliteSchemaTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, "templates.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_old_fts_table_and_triggers_are_dropped(self):
+        # A database as created by the FTS5 version
+        conn = sqlite3.connect(os.path.join(self.tmp.name, "templates.db"))
+        conn.executescript("""
+            CREATE TABLE templates (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL DEFAULT '', content TEXT NOT NULL DEFAULT '',
+                category TEXT NOT NULL DEFAULT '', timestamp TEXT);
+            CREATE TABLE templates_fts (title, content, category);
+            CREATE TRIGGER templates_ai AFTER INSERT ON templates BEGIN
+                INSERT INTO templates_fts VALUES (new.title, new.content, new.category);
+            END;
+            INSERT INTO templates (id, title, content, category) VALUES ('a', 't', 'c', 'General');
+        """)
+        conn.close()
+
+        handler = DataHandler(self.data_file, storage="sqlite", write_delay=0)
+        handler.add_template("new", "body")
+        self.assertEqual(len(handler.load_data()), 2)
+        names = {r[0] for r in handler.storage._conn.execute("SELECT name FROM sqlite_master")}
+        handler.storage._conn.close()
+        self.assertNotIn("templates_fts", names)
+        self.assertNotIn("templates_ai", names)
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, "templates.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_non_string_fields_become_text(self):
+        path = os.path.join(self.tmp.name, "in.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"id": 7, "title": 1234, "content": None, "category": ["a"]}) + "\n")
+        handler = DataHandler(self.data_file, write_delay=0)
+        self.assertEqual(handler.import_templates(path)["count"], 1)
+
+        item = handler.load_data()[0]
+        self.assertEqual(item, dict(item, id="7", title="1234", content="", category="['a']"))
+        # Indexing (and so the list) must not fail on it
+        index = TemplateSearch()
+        index.sync([item])
+        self.assertEqual(index.search("123"), [item])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from usage import UsageTracker, DAY
+
+
+class UsageTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "usage.json")
+        # Writes only happen on flush()
+        self.usage = UsageTracker(self.path, write_delay=3600)
+
+    def tearDown(self):
+        self.usage.flush()
+        self.tmp.cleanup()
+
+    def test_record_counts_uses(self):
+        self.usage.record("a", now=100.0)
+        self.usage.record("a", now=200.0)
+        self.usage.record(None)
+        self.assertEqual(self.usage.get("a"), (2, 200.0))
+        self.assertIsNone(self.usage.get("b"))
+        self.assertEqual(len(self.usage), 1)
+
+    def test_recent_uses_weigh_more(self):
+        now = 1000 * DAY
+        self.usage.record("recent", now=now - DAY / 2)
+        for _ in range(3):
+            self.usage.record("old", now=now - 100 * DAY)
+        self.assertEqual(self.usage.frecency("recent", now), 100)
+        self.assertEqual(self.usage.frecency("old", now), 30)
+        self.assertEqual(self.usage.frecency("never", now), 0)
+
+    def test_sort_key_puts_frecent_first_then_fallback(self):
+        self.usage.record("b")
+        items = [{"id": "c", "title": "c"}, {"id": "a", "title": "a"}, {"id": "b", "title": "b"}]
+        items.sort(key=self.usage.sort_key(lambda item: item['title']))
+        self.assertEqual([item['id'] for item in items], ["b", "a", "c"])
+
+    def test_forget_drops_counters(self):
+        self.usage.record("a")
+        self.usage.record("b")
+        version = self.usage.version
+        self.usage.forget(["a", "missing"])
+        self.assertIsNone(self.usage.get("a"))
+        self.assertGreater(self.usage.version, version)
+        # Nothing to drop: no change
+        version = self.usage.version
+        self.usage.forget(["missing"])
+        self.assertEqual(self.usage.version, version)
+
+    def test_flush_writes_and_reload_reads(self):
+        self.usage.record("a", now=100.0)
+        self.assertFalse(os.path.exists(self.path))
+        self.usage.flush()
+        reloaded = UsageTracker(self.path)
+        self.assertEqual(reloaded.get("a"), (1, 100.0))
+
+    def test_malformed_entries_are_ignored(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"a": [2, 50.0], "b": "x", "c": [1]}, f)
+        self.assertEqual(UsageTracker(self.path).get("a"), (2, 50.0))
+        self.assertEqual(len(UsageTracker(self.path)), 1)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write("[1, 2")
+        self.assertEqual(len(UsageTracker(self.path)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
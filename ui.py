@@ -1,40 +1,291 @@
 import customtkinter as ctk
 import tkinter as tk
+import threading
 from data_handler import DataHandler
-import ctypes
-from ctypes import Structure, c_long, c_ulong, byref, sizeof
-
-class POINT(Structure):
-    _fields_ = [("x", c_long), ("y", c_long)]
-
-class RECT(Structure):
-    _fields_ = [
-        ("left", c_long),
-        ("top", c_long),
-        ("right", c_long),
-        ("bottom", c_long)
-    ]
-
-class MONITORINFO(Structure):
-    _fields_ = [
-        ("cbSize", c_ulong),
-        ("rcMonitor", RECT),
-        ("rcWork", RECT),
-        ("dwFlags", c_ulong)
-    ]
+from search import TemplateSearch, SearchWorker, scan
+from clipboard_manager import is_history_item
+import metrics
 
 MONITOR_DEFAULTTONEAREST = 2
+_win32_types = None
+
+def win32_types():
+    """
+    ctypes structures for the cursor/monitor calls, defined on first use so
+    ctypes stays out of startup. Returns (POINT, MONITORINFO).
+    """
+    global _win32_types
+    if _win32_types is None:
+        from ctypes import Structure, c_long, c_ulong
+
+        class POINT(Structure):
+            _fields_ = [("x", c_long), ("y", c_long)]
+
+        class RECT(Structure):
+            _fields_ = [
+                ("left", c_long),
+                ("top", c_long),
+                ("right", c_long),
+                ("bottom", c_long)
+            ]
+
+        class MONITORINFO(Structure):
+            _fields_ = [
+                ("cbSize", c_ulong),
+                ("rcMonitor", RECT),
+                ("rcWork", RECT),
+                ("dwFlags", c_ulong)
+            ]
+
+        _win32_types = (POINT, MONITORINFO)
+    return _win32_types
 
 # Configuration
 FONT_FAMILY = "Yu Gothic UI"
 FONT_SIZE_NORMAL = 14
 FONT_SIZE_LARGE = 16
+# Search results shown at most (best-ranked first)
+MAX_RESULTS = 500
+
+# Clipboard history rows shown above the templates
+HISTORY_PREVIEW = 5
+HISTORY_MAX_RESULTS = 50
+
+# Wait this long after the last keystroke before searching
+SEARCH_DEBOUNCE_MS = 30
+
+# Fixed row heights so the list can be virtualized
+ROW_HEIGHT = 40
+ROW_HEIGHT_SNIPPET = 68
+SNIPPET_CONTEXT = 15
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
+def template_sort_key(item):
+    # List order: by Category then Title
+    return (item.get('category', 'ZZZ'), item.get('title', ''))
+
+def make_snippet(content, query):
+    """
+    Returns (snippet_text, highlight_start) around the first hit of query in
+    content, or None if content doesn't contain it.
+    """
+    if not query:
+        return None
+    start_idx = content.lower().find(query)
+    if start_idx < 0:
+        return None
+
+    # Extract snippet (e.g. 15 chars before/after)
+    snip_start = max(0, start_idx - SNIPPET_CONTEXT)
+    snip_end = min(len(content), start_idx + len(query) + SNIPPET_CONTEXT)
+
+    prefix = "..." if snip_start > 0 else ""
+    suffix = "..." if snip_end < len(content) else ""
+    # Keep the snippet on one line
+    body = content[snip_start:snip_end].replace("\n", " ")
+    snippet_text = f"└ {prefix}{body}{suffix}"
+    match_pos_in_snippet = len(f"└ {prefix}") + (start_idx - snip_start)
+    return snippet_text, match_pos_in_snippet
+
+
+class ResultRow(ctk.CTkFrame):
+    """
+    One recyclable row of the result list. bind() points it at another template.
+    """
+    def __init__(self, master, font, on_select, on_edit, on_delete, content_loader):
+        super().__init__(master, height=ROW_HEIGHT - 2)
+        # Keep the fixed row height regardless of the children's size
+        self.pack_propagate(False)
+        self.item = None
+        self.content_loader = content_loader
+        self.on_select = on_select
+        self.on_edit = on_edit
+        self.on_delete = on_delete
+
+        # Header Frame (Title + Buttons)
+        header_frame = ctk.CTkFrame(self, fg_color="transparent")
+        header_frame.pack(fill="x")
+
+        # Delete Button (Right)
+        self.del_btn = ctk.CTkButton(
+            header_frame, text="🗑️", width=30, fg_color="transparent", hover_color=("gray70", "gray30"), text_color=("gray10", "gray90"),
+            font=font,
+            command=lambda: self.item and self.on_delete(self.item.get('id'))
+        )
+        self.del_btn.pack(side="right", padx=2)
+
+        # Edit Button (Right)
+        self.edit_btn = ctk.CTkButton(
+            header_frame, text="✏️", width=30, fg_color="transparent", hover_color=("gray70", "gray30"), text_color=("gray10", "gray90"),
+            font=font,
+            command=lambda: self.item and self.on_edit(self.item)
+        )
+        self.edit_btn.pack(side="right", padx=2)
+
+        # Title (Left, fills remaining)
+        self.title_btn = ctk.CTkButton(
+            header_frame,
+            text="",
+            anchor="w",
+            fg_color="transparent",
+            text_color=("gray10", "gray90"),
+            hover_color=("gray70", "gray30"),
+            font=font,
+            command=lambda: self.item and self.on_select(self.item)
+        )
+        self.title_btn.pack(fill="x", side="left", expand=True)
+
+        # Search Highlight Snippet (shown only when the content matches)
+        self.snippet_box = ctk.CTkTextbox(
+            self,
+            height=25,
+            fg_color="transparent",
+            text_color="gray",
+            font=font,
+            activate_scrollbars=False,
+            wrap="none"
+        )
+        self.snippet_box.tag_config("highlight", background="yellow", foreground="black")
+        self.snippet_visible = False
+
+    def bind_item(self, item, query=""):
+        self.item = item
+        self.title_btn.configure(text=f"{item.get('title')} ({item.get('category', 'General')})")
+
+        # Bodies may live on disk; only rows on screen with a query read them
+        snippet = make_snippet(self.content_loader(item), query) if query else None
+        if not snippet:
+            if self.snippet_visible:
+                self.snippet_box.pack_forget()
+                self.snippet_visible = False
+            return
+
+        snippet_text, match_pos = snippet
+        try:
+            self.snippet_box.configure(state="normal")
+            self.snippet_box.delete("1.0", "end")
+            self.snippet_box.insert("1.0", snippet_text)
+            self.snippet_box.tag_add("highlight", f"1.{match_pos}", f"1.{match_pos + len(query)}")
+            self.snippet_box.configure(state="disabled")
+        except Exception as e:
+            print(f"Snippet error: {e}")
+        if not self.snippet_visible:
+            self.snippet_box.pack(fill="x", padx=(40, 0), pady=(0, 2)) # Increased indent
+            self.snippet_visible = True
+
+    def wheel_targets(self):
+        # Every widget the mouse can be over inside this row
+        stack = [self]
+        while stack:
+            w = stack.pop()
+            yield w
+            stack.extend(w.winfo_children())
+
+
+class VirtualList(ctk.CTkFrame):
+    """
+    Scrollable list that only ever builds enough rows to fill the viewport.
+    Scrolling rebinds the pooled rows to a different slice of items, so the
+    widget count is independent of the number of templates.
+    """
+    def __init__(self, master, font, on_select, on_edit, on_delete, content_loader):
+        super().__init__(master)
+        self.font = font
+        self.content_loader = content_loader
+        self.on_select = on_select
+        self.on_edit = on_edit
+        self.on_delete = on_delete
+        self.items = []
+        self.query = ""
+        self.top = 0
+        self.rows = []
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True)
+
+        self.body.bind("<Configure>", lambda e: self.render())
+        self._bind_wheel(self.body)
+
+    @property
+    def row_height(self):
+        return ROW_HEIGHT_SNIPPET if self.query else ROW_HEIGHT
+
+    def visible_count(self):
+        height = max(self.body.winfo_height(), 1)
+        return height // self.row_height + 1
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self.on_mousewheel, add="+")
+        # X11 reports the wheel as buttons 4/5
+        widget.bind("<Button-4>", lambda e: self.scroll_rows(-3), add="+")
+        widget.bind("<Button-5>", lambda e: self.scroll_rows(3), add="+")
+
+    def _ensure_pool(self, count):
+        while len(self.rows) < count:
+            row = ResultRow(self.body, self.font, self.on_select, self.on_edit, self.on_delete, self.content_loader)
+            for w in row.wheel_targets():
+                self._bind_wheel(w)
+            self.rows.append(row)
+
+    def set_items(self, items, query="", keep_position=False):
+        self.items = items
+        self.query = query
+        self.top = min(self.top, self.max_top()) if keep_position else 0
+        self.render()
+
+    def max_top(self):
+        return max(0, len(self.items) - self.visible_count() + 1)
+
+    def scroll_rows(self, delta):
+        new_top = min(max(0, self.top + delta), self.max_top())
+        if new_top != self.top:
+            self.top = new_top
+            self.render()
+
+    def on_mousewheel(self, event):
+        # Windows/macOS: delta is a multiple of 120 (or small ints on macOS)
+        step = -1 if event.delta > 0 else 1
+        self.scroll_rows(step * 3)
+
+    def on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.top = min(max(0, int(float(value) * len(self.items))), self.max_top())
+            self.render()
+        elif action == "scroll":
+            count = int(value)
+            if unit == "pages":
+                count *= max(1, self.visible_count() - 1)
+            self.scroll_rows(count)
+
+    def render(self):
+        count = self.visible_count()
+        self._ensure_pool(count)
+        row_height = self.row_height
+        for slot, row in enumerate(self.rows):
+            index = self.top + slot
+            if slot < count and index < len(self.items):
+                row.bind_item(self.items[index], self.query)
+                if row.cget("height") != row_height - 2:
+                    row.configure(height=row_height - 2)
+                # CTk widgets take their size from configure(), not place()
+                row.place(x=0, y=slot * row_height, relwidth=1.0)
+            else:
+                row.place_forget()
+                row.item = None
+
+        total = len(self.items)
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + count - 1) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
 class MainWindow(ctk.CTk):
-    def __init__(self, on_paste_callback, on_edit_callback=None, data_handler=None):
+    def __init__(self, on_paste_callback, on_edit_callback=None, data_handler=None, event_queue=None, history=None, usage=None):
         super().__init__()
         self.title("Paste Template")
         self.geometry("600x400")
@@ -45,10 +296,40 @@ class MainWindow(ctk.CTk):
         self.on_edit_callback = on_edit_callback
         self.data_handler = data_handler or DataHandler()
         self.templates = []
-        self.item_widgets = [] # Track widgets for safe removal
+        # Lazy storage keeps bodies on disk; the index reads them on demand
+        self._content_loader = self.data_handler.read_content if self.data_handler.lazy_content else None
+        self.search_index = TemplateSearch(content_loader=self._content_loader)
+        # The first full index is built on a background thread; searches
+        # scan the list until it is ready
+        self._index_ready = False
+        self._index_builder = None
+        # Optional ClipboardHistory shown as its own section
+        self.history = history
+        # Optional UsageTracker: most frecent templates are listed first
+        self.usage = usage
+
+        # With an event queue, searches run on a worker thread and results
+        # come back as ("search_results", ...) events; otherwise inline.
+        self.event_queue = event_queue
+        self.search_worker = None
+        if event_queue is not None:
+            self.search_worker = SearchWorker(self._run_search, self._post_search_results)
+        self._search_token = 0
+        self._search_after_id = None
+        self._render_after_id = None
+        self._pending_results = None
+        # What the list currently shows, so reset_and_show can reuse it
+        self._view_version = None
+        # Templates version the search index reflects (may be ahead of the
+        # list when search_current() synced it off the GUI thread)
+        self._index_version = None
+        self._view_query = None
+        self._view_history_version = None
+        self._view_usage_version = None
         
         self.create_widgets()
-        self.refresh_list()
+        # Fill the list once the event loop is idle, not during startup
+        self.after_idle(self.refresh_if_stale)
         
         self.protocol("WM_DELETE_WINDOW", self.withdraw)
 
@@ -60,7 +341,11 @@ class MainWindow(ctk.CTk):
         y = (self.winfo_screenheight() // 2) - (height // 2)
         self.geometry(f'+{x}+{y}')
 
+    @metrics.traced("ui.move_to_cursor")
     def move_to_cursor(self):
+        import ctypes
+        from ctypes import byref, sizeof
+        POINT, MONITORINFO = win32_types()
         self.update_idletasks()
         
         # Get cursor position
@@ -138,158 +423,316 @@ class MainWindow(ctk.CTk):
         self.search_entry.pack(fill="x", padx=10, pady=10)
         self.search_entry.bind("<Return>", self.on_enter_pressed)
 
-        # Scrollable Frame for List
-        self.scroll_frame = ctk.CTkScrollableFrame(self)
-        self.scroll_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
-
+        # Virtualized list: a fixed pool of rows rebound as the user scrolls
+        self.result_list = VirtualList(
+            self,
+            font=self.main_font,
+            on_select=self.on_select,
+            on_edit=self.edit_item,
+            on_delete=self.delete_item,
+            content_loader=self.item_content
+        )
+        self.result_list.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+    @metrics.traced("ui.refresh_list")
     def refresh_list(self):
         try:
+            version = self.data_handler.current_version()
             raw_data = self.data_handler.load_data()
-            # Sort by Category then Title
-            self.templates = sorted(raw_data, key=lambda x: (x.get('category', 'ZZZ'), x.get('title', '')))
-            self.update_view(self.templates)
+            # Most used first, then by Category and Title
+            self._view_usage_version = self.usage.version if self.usage is not None else None
+            self.templates = sorted(raw_data, key=self.sort_key())
+            # Only re-indexes templates that were added/changed/removed
+            self._sync_index(self.templates, version)
+            self._view_version = version
+            if self.search_var.get():
+                # Search again (this also replaces a search the sync cancelled)
+                self.start_search()
+            else:
+                self.update_view(self.find_matches(""))
         except Exception as e:
             print(f"Error refreshing list: {e}")
 
-    def update_view(self, items, query=""):
-        try:
-            # Safely clear: Only destroy widgets we created
-            for w in self.item_widgets:
-                try:
-                    w.destroy()
-                except:
-                    pass
-            self.item_widgets = []
-
-            for idx, item in enumerate(items):
-                # Container for each item
-                frame = ctk.CTkFrame(self.scroll_frame)
-                frame.pack(fill="x", pady=2)
-                self.item_widgets.append(frame)
-                
-                # Header Frame (Title + Buttons)
-                header_frame = ctk.CTkFrame(frame, fg_color="transparent")
-                header_frame.pack(fill="x")
-
-                # Delete Button (Right)
-                del_btn = ctk.CTkButton(
-                    header_frame, text="🗑️", width=30, fg_color="transparent", hover_color=("gray70", "gray30"), text_color=("gray10", "gray90"),
-                    font=self.main_font,
-                    command=lambda tid=item.get('id'): self.delete_item(tid)
-                )
-                del_btn.pack(side="right", padx=2)
-
-                # Edit Button (Right)
-                edit_btn = ctk.CTkButton(
-                    header_frame, text="✏️", width=30, fg_color="transparent", hover_color=("gray70", "gray30"), text_color=("gray10", "gray90"),
-                    font=self.main_font,
-                    command=lambda i=item: self.edit_item(i)
-                )
-                edit_btn.pack(side="right", padx=2)
-
-                # Title (Left, fills remaining)
-                btn = ctk.CTkButton(
-                    header_frame, 
-                    text=f"{item.get('title')} ({item.get('category', 'General')})", 
-                    anchor="w",
-                    fg_color="transparent",
-                    text_color=("gray10", "gray90"),
-                    hover_color=("gray70", "gray30"),
-                    font=self.main_font,
-                    command=lambda text=item.get('content'): self.on_select(text)
-                )
-                btn.pack(fill="x", side="left", expand=True)
-                
-                # Search Highlight Snippet
-                content = item.get('content', '')
-                if query and query in content.lower():
-                    try:
-                        # Find match
-                        lower_content = content.lower()
-                        start_idx = lower_content.find(query)
-                        
-                        # Extract snippet (e.g. 15 chars before/after)
-                        snip_start = max(0, start_idx - 15)
-                        snip_end = min(len(content), start_idx + len(query) + 15)
-                        
-                        prefix = "..." if snip_start > 0 else ""
-                        suffix = "..." if snip_end < len(content) else ""
-                        snippet_text = f"└ {prefix}{content[snip_start:snip_end]}{suffix}"
-                        
-                        # Create minimal textbox for highlight
-                        # Check height needed? 1 line usually ~20-30px
-                        snippet_box = ctk.CTkTextbox(
-                            frame, 
-                            height=25, 
-                            fg_color="transparent", 
-                            text_color="gray",
-                            font=self.main_font, 
-                            activate_scrollbars=False
-                        )
-                        snippet_box.pack(fill="x", padx=(40, 0), pady=(0, 2)) # Increased indent
-                        
-                        snippet_box.insert("1.0", snippet_text)
-                        
-                        # Highlight
-                        # Calculate position in snippet_text
-                        # "└ ..." length depends on prefix
-                        match_pos_in_snippet = len(f"└ {prefix}") + (start_idx - snip_start)
-                        
-                        tag_start = f"1.{match_pos_in_snippet}"
-                        tag_end = f"1.{match_pos_in_snippet + len(query)}"
-                        
-                        snippet_box.tag_config("highlight", background="yellow", foreground="black")
-                        snippet_box.tag_add("highlight", tag_start, tag_end)
-                        
-                        snippet_box.configure(state="disabled")
-                    except Exception as e:
-                        print(f"Snippet error: {e}")
+    def sort_key(self):
+        if self.usage is None:
+            return template_sort_key
+        return self.usage.sort_key(template_sort_key)
+
+    def rerank(self):
+        """
+        Re-sorts the list after templates were used. The search index only
+        takes the new order (ties in search results follow it).
+        """
+        self._view_usage_version = self.usage.version
+        # A new list, not sorted in place: worker threads may be scanning it
+        self.templates = sorted(self.templates, key=self.sort_key())
+        self._sync_index(self.templates, self._view_version)
+
+    def _sync_index(self, templates, version):
+        if not self._index_ready:
+            if self.event_queue is not None:
+                # on_index_ready() catches up with the list
+                self._start_index_build(templates)
+                return
+            # No event loop to hand a background build back to: build inline
+            self._index_ready = True
+        # Don't wait for a worker search on the old templates to finish
+        self.cancel_search()
+        with self.search_index.lock:
+            self.search_index.sync(templates)
+            self._index_version = version
+
+    def cancel_search(self):
+        """
+        Stops the worker's search, if any, at its next check so the GUI
+        thread can take the index lock without waiting.
+        """
+        self._search_token += 1
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+
+    def _start_index_build(self, templates):
+        if self._index_builder is not None:
+            return
+        index = TemplateSearch(content_loader=self._content_loader)
+        snapshot = list(templates)
 
+        def build():
+            try:
+                with metrics.span("ui.index_build"):
+                    index.sync(snapshot)
+            except Exception as e:
+                print(f"Error building search index: {e}")
+                return
+            self.event_queue.put(("index_ready", index))
+
+        self._index_builder = threading.Thread(target=build, name="SearchIndexBuilder", daemon=True)
+        self._index_builder.start()
+
+    def on_index_ready(self, index):
+        """
+        GUI thread: takes over the index built in the background, after
+        indexing whatever changed in the meantime.
+        """
+        with index.lock:
+            index.sync(self.templates)
+            self.search_index = index
+            self._index_version = self._view_version
+            self._index_ready = True
+        if self.search_var.get():
+            # Re-rank the scanned results
+            self.start_search()
+
+    def refresh_if_stale(self):
+        if self.data_handler.current_version() != self._view_version:
+            self.refresh_list()
+            return True
+        return False
+
+    @metrics.traced("ui.update_view")
+    def update_view(self, items, query="", keep_position=False):
+        try:
+            # Rows are recycled; only the visible ones get (re)bound
+            self.result_list.set_items(items, query, keep_position=keep_position)
+            self._view_query = query
+            self._view_history_version = self.history.version if self.history is not None else None
         except Exception as e:
             print(f"Error updating view: {e}")
 
+    def on_templates_changed(self, diff):
+        """
+        Applies a DataHandler.reload_changes() diff (templates edited outside
+        the app) to the sorted list, the search index and the visible rows.
+        """
+        try:
+            if diff is None or diff["base"] != self._view_version:
+                # The change was picked up elsewhere or we missed one: rebuild if stale
+                if self.data_handler.current_version() != self._view_version:
+                    self.refresh_list()
+                return
+            drop = set(diff["removed"])
+            drop.update(item['id'] for item in diff["changed"])
+            templates = [item for item in self.templates if item.get('id') not in drop]
+            templates.extend(diff["added"])
+            templates.extend(diff["changed"])
+            # Mostly sorted already, so this is close to linear
+            templates.sort(key=self.sort_key())
+            self.templates = templates
+            if self.usage is not None:
+                self._view_usage_version = self.usage.version
+            # Only the added/changed/removed templates are re-indexed
+            self._sync_index(self.templates, diff["version"])
+            self._view_version = diff["version"]
+
+            query = self.search_var.get().lower()
+            if query:
+                self.start_search()
+            else:
+                self.update_view(self.find_matches(""), keep_position=True)
+        except Exception as e:
+            print(f"Error applying template changes: {e}")
+
     def delete_item(self, item_id):
-        self.data_handler.delete_template(item_id)
+        if self.history is not None and is_history_item({'id': item_id}):
+            self.history.remove(item_id)
+            self.start_search()
+            return
+        self.delete_template(item_id)
         self.refresh_list()
 
+    def delete_template(self, item_id):
+        """
+        Deletes a template and its use counters. Safe off the GUI thread
+        (RPC); the list isn't refreshed.
+        """
+        self.data_handler.delete_template(item_id)
+        if self.usage is not None:
+            # Only explicit deletes: a template missing from a (possibly
+            # half-written) file on reload may well come back
+            self.usage.forget([item_id])
+
     def edit_item(self, item):
+        if is_history_item(item):
+            # Editing a history entry saves it as a new template
+            item = dict(item, id=None, title="", category="General")
         if hasattr(self, 'on_edit_callback') and self.on_edit_callback:
             self.on_edit_callback(item)
 
+    def history_matches(self, query):
+        if self.history is None:
+            return []
+        if not query:
+            return self.history.entries(limit=HISTORY_PREVIEW)
+        return self.history.search(query, limit=HISTORY_MAX_RESULTS)
+
+    def find_matches(self, query, limit=MAX_RESULTS, cancelled=None, include_history=True):
+        history = self.history_matches(query) if include_history else []
+        if not query:
+            return history + self.templates if history else self.templates
+
+        # The in-memory index covers every backend (SQLite included)
+        if not self._index_ready:
+            results = scan(self.templates, query, limit, self._content_loader, cancelled)
+        else:
+            # Ranked best-first; only the top `limit` are selected
+            results = self.search_index.search(query, limit=limit, cancelled=cancelled)
+        return history + results if history else results
+
+    def search_current(self, query, limit=MAX_RESULTS):
+        """
+        Searches the templates as stored right now, for callers off the GUI
+        thread (RPC). If the list hasn't caught up with a change yet, the
+        index is brought up to date first. Returns a new list.
+        """
+        with self.search_index.lock:
+            if not self._index_ready:
+                templates = sorted(self.data_handler.load_data(), key=self.sort_key())
+                return scan(templates, query, limit, self._content_loader)
+            version = self.data_handler.current_version()
+            if version != self._index_version:
+                # Not _sync_index(): that cancels the GUI's worker search
+                templates = sorted(self.data_handler.load_data(), key=self.sort_key())
+                self.search_index.sync(templates)
+                self._index_version = version
+            return self.search_index.search(query, limit=limit)
+
+    def on_history_changed(self):
+        # Only redraw when the list is on screen
+        if self.state() != "withdrawn":
+            self.start_search()
+
     def filter_list(self, *args):
+        # Debounce: only search once typing pauses
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.start_search)
+
+    def start_search(self):
+        self._search_after_id = None
         query = self.search_var.get().lower()
-        if not query:
-            self.update_view(self.templates)
+        if not query or self.search_worker is None:
+            # Invalidate any result still in flight
+            self._search_token += 1
+            if not query:
+                self.update_view(self.find_matches(""))
+            else:
+                self.update_view(self.find_matches(query), query=query)
+            return
+        self._search_token = self.search_worker.submit(query)
+
+    def _run_search(self, query, cancelled):
+        # Worker thread
+        return self.find_matches(query, cancelled=cancelled)
+
+    def _post_search_results(self, token, query, results):
+        # Worker thread: hand over to the GUI thread via the app's queue
+        self.event_queue.put(("search_results", (token, query, results)))
+
+    def show_search_results(self, payload):
+        token, query, results = payload
+        if token != self._search_token:
+            return # A newer keystroke superseded this result
+        # Coalesce: only the latest result set is drawn once the GUI is idle
+        self._pending_results = (query, results)
+        if self._render_after_id is None:
+            self._render_after_id = self.after_idle(self._render_pending_results)
+
+    def _render_pending_results(self):
+        self._render_after_id = None
+        pending, self._pending_results = self._pending_results, None
+        if pending is None:
             return
+        query, results = pending
+        if query != self.search_var.get().lower():
+            return
+        self.update_view(results, query=query)
 
-        filtered = [
-            t for t in self.templates 
-            if query in t.get('title', '').lower() or query in t.get('content', '').lower() or query in t.get('category', '').lower()
-        ]
-        self.update_view(filtered, query=query)
+    def item_content(self, item):
+        if is_history_item(item) or 'content' in item:
+            return item.get('content', '')
+        return self.data_handler.read_content(item)
 
-    def on_select(self, text):
+    def on_select(self, item):
         self.withdraw() # Hide immediately
+        if self.usage is not None and not is_history_item(item):
+            # Only counted here; the list is re-ranked when next shown
+            self.usage.record(item.get('id'))
         if self.on_paste_callback:
-            self.on_paste_callback(text)
+            self.on_paste_callback(self.item_content(item))
 
     def on_enter_pressed(self, event):
         query = self.search_var.get().lower()
-        if not query:
-            filtered = self.templates
-        else:
-            filtered = [
-                t for t in self.templates 
-                if query in t.get('title', '').lower() or query in t.get('content', '').lower() or query in t.get('category', '').lower()
-            ]
+        # Searched right here, so a worker search still running is superseded
+        self.cancel_search()
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        # Best template first; clipboard history only if no template matches
+        filtered = self.find_matches(query, limit=1, include_history=False) or self.history_matches(query)
         
         if filtered:
-            self.on_select(filtered[0]['content'])
+            self.on_select(filtered[0])
 
+    @metrics.traced("ui.main.reset_and_show")
     def reset_and_show(self):
         print("Resetting and showing MainWindow...")
         self.search_var.set("") # Clear search
-        self.refresh_list()
+        # Show the full list now rather than after the search debounce
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        self._search_token += 1
+        if not self.refresh_if_stale():
+            if self.usage is not None and self.usage.version != self._view_usage_version:
+                # Templates were used since: re-sort without reloading
+                self.rerank()
+                self.update_view(self.find_matches(""))
+            elif self._view_query or (self.history is not None and self.history.version != self._view_history_version):
+                # Templates unchanged: no reload/re-sort/re-index, just redraw
+                self.update_view(self.find_matches(""))
+            else:
+                # Already showing the full list; just scroll back to the top
+                self.result_list.scroll_rows(-self.result_list.top)
         
         # Robust 'Front' logic for Main Window
         try:
@@ -322,6 +765,7 @@ class MainWindow(ctk.CTk):
 
     def enable_ime(self, hwnd):
         try:
+            import ctypes
             imm32 = ctypes.windll.imm32
             hIMC = imm32.ImmGetContext(hwnd)
             if hIMC:
@@ -331,14 +775,15 @@ class MainWindow(ctk.CTk):
             print(f"IME Error: {e}")
 
 class SaveWindow(ctk.CTkToplevel):
-    def __init__(self, parent, on_save_callback=None, on_cancel_callback=None):
+    def __init__(self, parent, on_save_callback=None, on_cancel_callback=None, data_handler=None):
         super().__init__(parent)
         self.title("Save Template")
         self.geometry("500x500")
         self.center_window()
         self.on_save_callback = on_save_callback
         self.on_cancel_callback = on_cancel_callback
-        self.data_handler = DataHandler()
+        # Share the parent's store so both windows see the same in-memory data
+        self.data_handler = data_handler or getattr(parent, 'data_handler', None) or DataHandler()
         
         self.create_widgets()
         self.protocol("WM_DELETE_WINDOW", self.cancel)
@@ -391,6 +836,7 @@ class SaveWindow(ctk.CTkToplevel):
                 print(f"Cancel callback failed: {e}")
         self.withdraw()
 
+    @metrics.traced("ui.save.reset_and_show")
     def reset_and_show(self, content, template_id=None, title="", category="General"):
         self.template_id = template_id # Store ID if editing
         
@@ -432,6 +878,7 @@ class SaveWindow(ctk.CTkToplevel):
 
     def enable_ime(self, hwnd):
         try:
+            import ctypes
             imm32 = ctypes.windll.imm32
             hIMC = imm32.ImmGetContext(hwnd)
             if hIMC:
@@ -440,6 +887,7 @@ class SaveWindow(ctk.CTkToplevel):
         except Exception as e:
             print(f"IME Error: {e}")
 
+    @metrics.traced("ui.save.save_template")
     def save_template(self):
         title = self.title_entry.get()
         
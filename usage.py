@@ -0,0 +1,127 @@
+"""
+Per-template use counters for frecency ranking. Kept in their own small
+file (usage.json) so a paste never rewrites the templates themselves.
+
+Format: {"<template id>": [use count, last used (unix time)], ...}
+"""
+import atexit
+import json
+import threading
+import time
+from storage import write_json_atomic
+
+USAGE_FILE = "usage.json"
+
+# Uses within this window (seconds) are written together in the background
+USAGE_WRITE_DELAY = 2.0
+
+# Weight of a use by how long ago the template was last used (days, weight),
+# as in browser frecency: recent use counts for more than old habits
+RECENCY_WEIGHTS = [
+    (1, 100),
+    (7, 70),
+    (30, 50),
+    (90, 30),
+]
+RECENCY_WEIGHT_OLD = 10
+DAY = 24 * 60 * 60
+
+class UsageTracker:
+    def __init__(self, path=USAGE_FILE, write_delay=USAGE_WRITE_DELAY):
+        self.path = path
+        self.write_delay = write_delay
+        self._lock = threading.Lock()
+        # One write at a time (the timer and a shutdown flush may overlap)
+        self._write_lock = threading.Lock()
+        self._counts = self._load()
+        self._timer = None
+        # Bumped on every change, so views can tell whether to re-rank
+        self.version = 0
+        atexit.register(self.flush)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading usage data: {e}")
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return {
+            item_id: [int(entry[0]), float(entry[1])]
+            for item_id, entry in data.items()
+            if isinstance(entry, list) and len(entry) == 2
+        }
+
+    def __len__(self):
+        return len(self._counts)
+
+    def record(self, item_id, now=None):
+        if item_id is None:
+            return
+        with self._lock:
+            entry = self._counts.setdefault(item_id, [0, 0.0])
+            entry[0] += 1
+            entry[1] = time.time() if now is None else now
+            self.version += 1
+            self._schedule_write()
+
+    def forget(self, item_ids):
+        """
+        Drops the counters of deleted templates.
+        """
+        with self._lock:
+            dropped = [item_id for item_id in item_ids if self._counts.pop(item_id, None) is not None]
+            if dropped:
+                self.version += 1
+                self._schedule_write()
+
+    def get(self, item_id):
+        """
+        Returns (use count, last used) or None if never used.
+        """
+        entry = self._counts.get(item_id)
+        return tuple(entry) if entry else None
+
+    def frecency(self, item_id, now=None):
+        entry = self._counts.get(item_id)
+        if entry is None:
+            return 0
+        count, last_used = entry
+        age_days = ((time.time() if now is None else now) - last_used) / DAY
+        for days, weight in RECENCY_WEIGHTS:
+            if age_days <= days:
+                return count * weight
+        return count * RECENCY_WEIGHT_OLD
+
+    def sort_key(self, fallback):
+        """
+        Returns a sort key: most frecent first, then fallback(item) for
+        templates never used (and for ties).
+        """
+        now = time.time()
+        frecency = self.frecency
+        return lambda item: (-frecency(item.get('id'), now), fallback(item))
+
+    def _schedule_write(self):
+        # Called with the lock held; one write per burst of uses
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                if self._timer is None:
+                    return
+                self._timer.cancel()
+                self._timer = None
+                snapshot = {item_id: list(entry) for item_id, entry in self._counts.items()}
+            try:
+                write_json_atomic(self.path, snapshot, indent=None)
+            except Exception as e:
+                print(f"Error saving usage data: {e}")
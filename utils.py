@@ -1,7 +1,27 @@
 import os
 import sys
+import json
 import subprocess
 
+CONFIG_FILE = "config.json"
+
+def load_config():
+    """
+    Returns the contents of config.json, or an empty dict if missing/broken.
+    """
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                config = json.load(f)
+                return config if isinstance(config, dict) else {}
+        except Exception:
+            return {}
+    return {}
+
+def save_config(config):
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f, indent=4)
+
 def get_executable_path():
     """
     Returns the absolute path to the executable or script.